@@ -27,7 +27,12 @@ version = 1.2
 import xml.etree.ElementTree as ET
 import os
 import re
-from math import sin, cos, radians, atan2, degrees
+import csv
+import json
+import queue
+import threading
+from math import sin, cos, radians, atan2, degrees, floor, ceil, hypot
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import argparse
 
 parser = argparse.ArgumentParser(description="create SVG paths from the command line") 
@@ -42,6 +47,14 @@ parser.add_argument('-x',type=float,help='x-coordinate to start at, specify with
 parser.add_argument('-y',type=float,help='y-coordinate to start at, specify with -x to apply. In svg coordinates')
 parser.add_argument('-a','--append',type=str,dest="path",help='ID of path to append')
 parser.add_argument('--log',type=str,help='Log file for executed commands')
+parser.add_argument('--serve',type=int,nargs='?',const=8000,metavar='PORT',
+  help='Serve the live preview on localhost at PORT (default 8000), pushing each change to the open page instead of rewriting svg_tmp.html')
+parser.add_argument('--snap',type=float,metavar='TOLERANCE',
+  help='Snap new points to the end points or segments of existing paths within this distance, in svg coordinates')
+parser.add_argument('--simplify',type=float,metavar='TOLERANCE',
+  help='Simplify batch paths, removing vertices of straight runs that are within this many meters of the simplified path')
+parser.add_argument('-b','--batch',nargs='+',metavar='FILE[@LAYER]',
+  help='Command logs or CSV surveys (angle,length[,move] rows) to each draw as a path, named after the file, on the layer given after @ or by --layer')
 parser.add_argument('args', nargs='*', help='A list of commands to run non-interactively')
 parser.add_argument('--version', action='version', version='%(prog)s {}'.format(version))
 arg_list = parser.parse_args()
@@ -58,9 +71,13 @@ key_map = {
   'print': 'p',
   'move': 'm', # only single char here
   'curve': 'c',
-  'angle': 'r' # only single char here
+  'angle': 'r', # only single char here
+  'simplify': 'x'
 }
 end_pos=[0,0]
+snap_index = None
+new_path = None # the path being drawn, once the prompts have set it up
+path_data = None
 
 # produced vector is 1 point per m, this sets the relationship between viewbox and height/width
 output_scale=arg_list.svg_scale
@@ -81,64 +98,326 @@ def cmd_list():
   print(' <m>{}<n>  move at angle m for length n '.format(key_map['move'][0]))
   print(' {}<n>,<m> add curve of radius n and relative angle m'.format(key_map['curve'][0]))
   print(' {}     print the current location in svg coordinates'.format(key_map['print'][0]))
+  print(' {}<n>  simplify the straight runs of the path, moving no point more than n'.format(key_map['simplify'][0]))
   print(' {}     undo last segment'.format(key_map['undo'][0]))
   print(' {}     show help message'.format(key_map['help'][0]))
   print(' {}     save'.format(key_map['save'][0]))
   print(' {}     save and quit'.format(key_map['quit'][0]))
 
-def calc_path_data(path):
-  pos = [0,0]
-  last_move = [0,0]
-  angle = 0
-  segments = re.findall(r'[A-Za-z][0-9.,\s-]*',path)
-  for segment in segments:
-    params = re.split(r'[\s,]',segment)
-    try:
-      if segment[0] == 'M':
-        pos = [float(params[1]),float(params[2])]
-        last_move = pos
-        angle = 0
-      if segment[0] == 'm':
-        pos[0] += float(params[1])
-        pos[1] += float(params[2])
-        last_move = pos
-        angle = 0
-      if segment[0] == 'L':
-        angle = degrees(-90-atan2(-(float(params[2])-pos[1]),float(params[1])-pos[0]))
-        pos = [float(params[1]),float(params[2])]
-      if segment[0] == 'l':
-        angle = degrees(-90-atan2(float(params[2]),float(params[1])))
-        pos[0] += float(params[1])
-        pos[1] += float(params[2])
-      if segment[0] == 'H':
-        angle = 90 if (float(params[1])-pos[0]) >=0 else -90
-        pos[0] = float(params[1])
-      if segment[0] == 'h':
-        angle = 90 if float(params[1]) >=0 else -90
-        pos[0] += float(params[1])
-      if segment[0] == 'V':
-        pos[1] = float(params[1])
-        angle = 180 if (float(params[1])-pos[1]) >=0 else 0
-      if segment[0] == 'v':
-        pos[1] += float(params[1])
-        angle = 180 if float(params[1]) >=0 else 0
-      if segment[0] in [ 'C','S','Q','T','A' ]:
-        pos_str = params[-2:]
-        pos = [float(pos_str[0]),float(pos_str[1])]
-        angle = 0
-      if segment[0] in [ 'c','s','q','t','a' ]:
-        pos[0] += float(params[1])
-        pos[1] += float(params[2])
-        angle = 0
-      if segment[0] in [ 'Z','z' ]:
-        angle = degrees(-90-atan2(last_move[1]-pos[1],last_move[0]-pos[0]))
-        pos = last_move
-    except IndexError:
-      pass
-  return pos, angle
+def segment_heading(dx, dy, angle):
+  # heading of a move in degrees, 0 is up and positive is clockwise, unchanged if it doesn't move
+  if dx == 0 and dy == 0:
+    return angle
+  return degrees(atan2(dx, -dy))
+
+path_arity = { 'M': 2, 'L': 2, 'T': 2, 'H': 1, 'V': 1, 'C': 6, 'S': 4, 'Q': 4, 'A': 7, 'Z': 0 } # numbers per vertex
+number_re = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+
+def split_path_data(d: str):
+  # a d attribute as one segment per vertex, writing out the commands implied by repeated numbers
+  segments = []
+  for cmd, args in re.findall(r'([A-Za-z])((?:[\s,]*{})*)'.format(number_re), d):
+    arity = path_arity.get(cmd.upper())
+    if arity is None:
+      continue
+    if arity == 0:
+      segments.append(cmd + ' ')
+      continue
+    nums = re.findall(number_re, args)
+    if len(nums) == arity: # keep single vertex commands as they were written
+      segments.append(cmd + args if args[-1:].isspace() else cmd + args + ' ')
+      continue
+    for idx in range(0, len(nums) - arity + 1, arity):
+      segments.append('{} {} '.format(cmd, ' '.join(nums[idx:idx + arity])))
+      if cmd in 'Mm': # the pairs after a move are lines
+        cmd = 'l' if cmd == 'm' else 'L'
+  return segments
+
+def step_path_data(segment, state):
+  # the (pos, last_move, angle) state after a single path segment
+  pos, last_move, angle = state
+  nums = [float(x) for x in re.findall(number_re, segment[1:])]
+  rel = segment[0].islower()
+  base = pos if rel else [0,0]
+  try:
+    if segment[0] in 'Mm':
+      pos = [base[0] + nums[0], base[1] + nums[1]]
+      return pos, pos, 0
+    if segment[0] in 'Ll':
+      end = [base[0] + nums[0], base[1] + nums[1]]
+    elif segment[0] in 'Hh':
+      end = [base[0] + nums[0], pos[1]]
+    elif segment[0] in 'Vv':
+      end = [pos[0], base[1] + nums[0]]
+    elif segment[0] in 'CcSsQqTtAa':
+      end = [base[0] + nums[-2], base[1] + nums[-1]]
+      if segment[0] in 'CcSsQq': # leaves along the line from the last control point
+        ctl = [base[0] + nums[-4], base[1] + nums[-3]]
+        return end, last_move, segment_heading(end[0] - ctl[0], end[1] - ctl[1], angle)
+    elif segment[0] in 'Zz':
+      end = last_move
+    else:
+      return state
+  except IndexError:
+    return state
+  return end, last_move, segment_heading(end[0] - pos[0], end[1] - pos[1], angle)
+
+class PathData:
+  # the path as a list of segments along with the state after each, so adding a segment,
+  # undoing one and finding the current position or heading never replays the whole path
+  def __init__(self, d=''):
+    self.segments = []
+    self.states = [([0,0], [0,0], 0)]
+    for segment in split_path_data(d):
+      self.append(segment)
+
+  def append(self, segment):
+    self.segments.append(segment)
+    self.states.append(step_path_data(segment, self.states[-1]))
+
+  def undo(self) -> bool:
+    if len(self.segments) <= 1: # keep the start position
+      return False
+    self.segments.pop()
+    self.states.pop()
+    return True
+
+  @property
+  def pos(self):
+    return list(self.states[-1][0])
+
+  @property
+  def angle(self):
+    return self.states[-1][2]
+
+  def d(self) -> str:
+    return ''.join(self.segments)
+
+  def simplify(self, tolerance: float):
+    # drop the vertices of each run of straight segments that Douglas-Peucker finds within the tolerance
+    segments, states = self.segments, self.states
+    self.segments, self.states = [], states[:1]
+    removed = 0
+    run = []
+    for idx, segment in enumerate(segments + [None]):
+      if segment is not None and segment[0] in 'LlHhVv':
+        run.append(idx + 1)
+        continue
+      if run:
+        points = [states[run[0] - 1][0]] + [states[i][0] for i in run]
+        keep = douglas_peucker(points, tolerance)
+        removed += keep.count(False)
+        last = points[0]
+        for point, kept in zip(points[1:], keep[1:]):
+          if not kept:
+            continue
+          if point[1] == last[1]:
+            self.append("H {} ".format(point[0]))
+          elif point[0] == last[0]:
+            self.append("V {} ".format(point[1]))
+          else:
+            self.append("L {0[0]} {0[1]} ".format(point))
+          last = point
+        run = []
+      if segment is not None:
+        self.append(segment)
+    return removed, sum(1 for segment in segments if segment[0] not in 'Zz') # a close adds no vertex
+
+def douglas_peucker(points, tolerance: float):
+  # which points to keep so that none removed is further than the tolerance from the simplified line
+  keep = [False] * len(points)
+  keep[0] = keep[-1] = True
+  stack = [(0, len(points) - 1)]
+  while stack:
+    first, last = stack.pop()
+    worst, worst_idx = 0, None
+    for idx in range(first + 1, last):
+      dist = closest_on_segment(points[idx], points[first], points[last])[0]
+      if dist > worst:
+        worst, worst_idx = dist, idx
+    if worst > tolerance:
+      keep[worst_idx] = True
+      stack += [(first, worst_idx), (worst_idx, last)]
+  return keep
+
+def parse_transform(transform: str):
+  # an SVG transform attribute as an affine matrix (a, b, c, d, e, f)
+  matrix = (1, 0, 0, 1, 0, 0)
+  for name, params in re.findall(r'(\w+)\s*\(([^)]*)\)', transform or ''):
+    nums = [float(x) for x in re.split(r'[\s,]+', params.strip()) if x]
+    if name == 'matrix' and len(nums) == 6:
+      step = tuple(nums)
+    elif name == 'translate' and nums:
+      step = (1, 0, 0, 1, nums[0], nums[1] if len(nums) > 1 else 0)
+    elif name == 'scale' and nums:
+      step = (nums[0], 0, 0, nums[1] if len(nums) > 1 else nums[0], 0, 0)
+    elif name == 'rotate' and nums:
+      a, cx, cy = radians(nums[0]), *(nums[1:3] if len(nums) == 3 else (0, 0))
+      step = (cos(a), sin(a), -sin(a), cos(a), cx - cx*cos(a) + cy*sin(a), cy - cx*sin(a) - cy*cos(a))
+    else:
+      continue
+    matrix = multiply_transform(matrix, step)
+  return matrix
+
+def multiply_transform(m, n):
+  return (m[0]*n[0] + m[2]*n[1], m[1]*n[0] + m[3]*n[1], m[0]*n[2] + m[2]*n[3], m[1]*n[2] + m[3]*n[3],
+    m[0]*n[4] + m[2]*n[5] + m[4], m[1]*n[4] + m[3]*n[5] + m[5])
+
+def invert_transform(m):
+  det = m[0]*m[3] - m[1]*m[2]
+  return (m[3]/det, -m[1]/det, -m[2]/det, m[0]/det, (m[2]*m[5] - m[3]*m[4])/det, (m[1]*m[4] - m[0]*m[5])/det)
+
+def apply_transform(m, pos):
+  return (m[0]*pos[0] + m[2]*pos[1] + m[4], m[1]*pos[0] + m[3]*pos[1] + m[5])
+
+class SnapIndex:
+  # a grid of the end points and segments of existing paths, with cells the size of the tolerance
+  # so a query only looks at the few cells around the new point
+  def __init__(self, tolerance: float):
+    self.tolerance = tolerance
+    self.points = {}
+    self.segments = {}
+
+  def cell(self, pos):
+    return (floor(pos[0] / self.tolerance), floor(pos[1] / self.tolerance))
+
+  def add_point(self, pos):
+    self.points.setdefault(self.cell(pos), []).append(pos)
+
+  def add_segment(self, start, end):
+    # sample every half cell, so each cell the segment crosses is next to a sampled one
+    steps = max(1, ceil(hypot(end[0] - start[0], end[1] - start[1]) * 2 / self.tolerance))
+    cells = {self.cell((start[0] + (end[0] - start[0])*i/steps, start[1] + (end[1] - start[1])*i/steps)) for i in range(steps + 1)}
+    for cell in cells:
+      self.segments.setdefault(cell, []).append((start, end))
+
+  def nearby(self, grid, pos):
+    x, y = self.cell(pos)
+    for i in range(x - 2, x + 3):
+      for j in range(y - 2, y + 3):
+        yield from grid.get((i, j), ())
+
+  def snap(self, pos):
+    # the nearest end point within the tolerance, else the nearest point on a segment, else pos
+    best = min(((hypot(x - pos[0], y - pos[1]), (x, y)) for x, y in self.nearby(self.points, pos)), default=None)
+    if best is None or best[0] > self.tolerance:
+      best = min((closest_on_segment(pos, *segment) for segment in set(self.nearby(self.segments, pos))), default=None)
+    if best is None or best[0] > self.tolerance:
+      return pos
+    return list(best[1])
+
+def closest_on_segment(pos, start, end):
+  dx, dy = end[0] - start[0], end[1] - start[1]
+  length = dx*dx + dy*dy
+  if dx == 0 or dy == 0: # keep the coordinates of straight walls exact
+    point = (min(max(pos[0], min(start[0], end[0])), max(start[0], end[0])),
+      min(max(pos[1], min(start[1], end[1])), max(start[1], end[1])))
+  else:
+    t = max(0, min(1, ((pos[0] - start[0])*dx + (pos[1] - start[1])*dy) / length))
+    point = (start[0] + t*dx, start[1] + t*dy)
+  return hypot(point[0] - pos[0], point[1] - pos[1]), point
+
+def build_snap_index(root: ET.Element, layer_root: ET.Element, tolerance: float) -> SnapIndex:
+  # index every path in the drawing, in the coordinates of the layer being drawn on
+  index = SnapIndex(tolerance)
+  paths = []
+  layer_transform = (1, 0, 0, 1, 0, 0)
+  stack = [(root, parse_transform(root.get('transform')))]
+  while stack:
+    element, transform = stack.pop()
+    if element is layer_root:
+      layer_transform = transform
+    if element.tag in ['path', '{http://www.w3.org/2000/svg}path']:
+      paths.append((element.get('d', ''), transform))
+    for child in element:
+      stack.append((child, multiply_transform(transform, parse_transform(child.get('transform')))))
+
+  to_layer = invert_transform(layer_transform)
+  for d, transform in paths:
+    transform = multiply_transform(to_layer, transform)
+    state = ([0,0], [0,0], 0)
+    for segment in split_path_data(d):
+      start, state = state[0], step_path_data(segment, state)
+      end = apply_transform(transform, state[0])
+      index.add_point(end)
+      if segment[0] not in 'Mm':
+        index.add_segment(apply_transform(transform, start), end)
+  return index
+
+def snap_pos(pos, axis=None):
+  # pull a new point onto the existing drawing, only along the axis of an H or V segment
+  if snap_index is None:
+    return pos
+  snapped = snap_index.snap(pos)
+  if axis is not None:
+    snapped = [snapped[0], pos[1]] if axis == 0 else [pos[0], snapped[1]]
+  if snapped != pos:
+    print('snapped to {}, {}'.format(snapped[0], snapped[1]))
+  return snapped
+
+preview_page = """<!DOCTYPE html><html><head><style>svg {{display:block; position:fixed;top:0; left:0; width:100%; height:100%;}}</style></head>
+<body>{}<script>
+new EventSource('/events').onmessage = function(event) {{
+  var update = JSON.parse(event.data), svg = document.querySelector('svg');
+  ['viewBox', 'width', 'height'].forEach(function(name) {{ svg.setAttribute(name, update[name]); }});
+  var path = document.querySelector('[data-svg-plot=active]');
+  if (!path) return location.reload(); // opened before the path was started
+  path.setAttribute('d', update.d);
+}};
+</script></body></html>"""
+preview_clients = [] # a queue of updates for each open preview page
+preview_lock = threading.Lock() # held while the drawing changes, so pages never see it half done
+
+class PreviewHandler(BaseHTTPRequestHandler):
+  # serves the whole drawing once per page load, then only the changes as server-sent events
+  def do_GET(self):
+    if self.path == '/':
+      with preview_lock:
+        if path_data is None: # still at the prompts, show the drawing as it is
+          page = preview_page.format(ET.tostring(root, encoding='unicode')).encode()
+        else:
+          new_path.attrib['d'] = path_data.d()
+          new_path.attrib['data-svg-plot'] = 'active' # so the page can find the path being drawn
+          page = preview_page.format(ET.tostring(root, encoding='unicode')).encode()
+          del new_path.attrib['data-svg-plot']
+      self.send_response(200)
+      self.send_header('Content-Type', 'text/html; charset=utf-8')
+      self.send_header('Content-Length', str(len(page)))
+      self.end_headers()
+      self.wfile.write(page)
+    elif self.path == '/events':
+      updates = queue.SimpleQueue()
+      preview_clients.append(updates)
+      self.send_response(200)
+      self.send_header('Content-Type', 'text/event-stream')
+      self.send_header('Cache-Control', 'no-cache')
+      self.end_headers()
+      try:
+        while True:
+          self.wfile.write('data: {}\n\n'.format(updates.get()).encode())
+          self.wfile.flush()
+      except (BrokenPipeError, ConnectionResetError):
+        pass
+      finally:
+        preview_clients.remove(updates)
+    else:
+      self.send_error(404)
+
+  def log_message(self, format, *args):
+    pass # keep the prompt clean
+
+def push_preview(root: ET.Element, d: str):
+  update = json.dumps({ 'd': d, **{ name: root.attrib[name] for name in ['viewBox', 'width', 'height'] } })
+  for updates in list(preview_clients):
+    updates.put(update)
+
+def remove_preview():
+  if not (arg_list.args or arg_list.batch) and arg_list.serve is None:
+    os.remove(tmp_name) # remove tmp file
 
 def process_command(root: ET.Element, new_path: ET.Element,cmd: str, scale: float, log=None) -> bool:
   global end_pos
+  # path_data holds the path being drawn, new_path only gets its d attribute when written out
 
   if len(cmd) == 0:
     return True
@@ -153,11 +432,11 @@ def process_command(root: ET.Element, new_path: ET.Element,cmd: str, scale: floa
       # calc end pos from direction, length, last pos
       change_x = scale * args[1] * sin(radians(args[0]))
       change_y = scale * args[1] * cos(radians(args[0]))
-      end_pos = [end_pos[0] + change_x, end_pos[1] - change_y ]
+      end_pos = snap_pos([end_pos[0] + change_x, end_pos[1] - change_y ])
       if key_map['angle'][0] in cmd:
-        new_path.attrib['d'] += "L {0[0]} {0[1]} ".format(end_pos) # append path
+        path_data.append("L {0[0]} {0[1]} ".format(end_pos)) # append path
       elif key_map['move'][0] in cmd:
-        new_path.attrib['d'] += "M {0[0]} {0[1]} ".format(end_pos) # append path
+        path_data.append("M {0[0]} {0[1]} ".format(end_pos)) # append path
     else:
       print('invalid command')
       return True
@@ -166,30 +445,35 @@ def process_command(root: ET.Element, new_path: ET.Element,cmd: str, scale: floa
       log.write(cmd+'\n')
     return False
   elif cmd[0] in key_map['undo']:
-    try: # remove last segment of path
-      new_path.attrib['d'] = re.match(r'(.*)([MLHVCSQTAZmlhvcsqtaz][ 0-9.,-]*)$',new_path.attrib['d'])[1]
-      end_pos =  calc_path_data(new_path.attrib['d'])[0] # reset last pos
-    except TypeError:
+    if path_data.undo(): # remove last segment of path
+      end_pos = path_data.pos # reset last pos
+    else:
       print('Nothing to undo, start position cannot be changed')
       if input('Would you like to exit without saving?').lower() in ['y','yes']:
-        os.remove(tmp_name) # remove tmp file
+        remove_preview()
         exit(0)
   elif cmd[0] in key_map['help']:
     cmd_list()
   elif cmd[0] in key_map['print']:
     print('{}, {}'.format(end_pos[0],end_pos[1]))
   elif cmd[0] in key_map['save']:
+    new_path.attrib['d'] = path_data.d()
     ET.ElementTree(root).write(svg_name,xml_declaration=True,encoding='UTF-8') # save svg
     if log:
       log.write(cmd+'\n')
     return True
+  elif cmd[0] in key_map['simplify']:
+    if not valid_num(cmd[1:]):
+      print('invalid command')
+      return True
+    removed, total = path_data.simplify(float(cmd[1:]))
+    print('removed {} of {} vertices'.format(removed, total))
   elif cmd[0] in key_map['curve']:
     # 1=radius, 2=rel angle (+ is right, - is left)
     args = cmd[1:].split(',')
     if len(args) == 2 and valid_num(args[0]) and valid_num(args[1]):
       args = [float(x) for x in args]
-      # calculate path angle
-      angle = calc_path_data(new_path.attrib['d'])[1]
+      angle = path_data.angle # current path angle
 
       change_x_ctl = scale * args[0] * sin(radians(angle))
       change_y_ctl = scale * args[0] * cos(radians(angle))
@@ -197,9 +481,9 @@ def process_command(root: ET.Element, new_path: ET.Element,cmd: str, scale: floa
 
       change_x_fin = scale * args[0] * sin(radians(angle+args[1]))
       change_y_fin = scale * args[0] * cos(radians(angle+args[1]))
-      pos_fin = [pos_ctl[0] + change_x_fin, pos_ctl[1] - change_y_fin ]
+      pos_fin = snap_pos([pos_ctl[0] + change_x_fin, pos_ctl[1] - change_y_fin ])
 
-      new_path.attrib['d'] += "Q {0[0]} {0[1]} {1[0]} {1[1]} ".format(pos_ctl,pos_fin) # append path
+      path_data.append("Q {0[0]} {0[1]} {1[0]} {1[1]} ".format(pos_ctl,pos_fin)) # append path
       end_pos = pos_fin
     else:
       print('invalid command')
@@ -212,19 +496,29 @@ def process_command(root: ET.Element, new_path: ET.Element,cmd: str, scale: floa
       return True
     if cmd[0] in key_map['north']: # convert char into direction
       end_pos[1] -= length # calc end pos from direction, length, last pos
-      new_path.attrib['d'] += "V {} ".format(end_pos[1]) # append path
+      end_pos = snap_pos(end_pos, 1)
+      path_data.append("V {} ".format(end_pos[1])) # append path
     elif cmd[0] in key_map['east']:
       end_pos[0] += length # calc end pos from direction, length, last pos
-      new_path.attrib['d'] += "H {} ".format(end_pos[0]) # append path
+      end_pos = snap_pos(end_pos, 0)
+      path_data.append("H {} ".format(end_pos[0])) # append path
     elif cmd[0] in key_map['south']:
       end_pos[1] += length # calc end pos from direction, length, last pos
-      new_path.attrib['d'] += "V {} ".format(end_pos[1]) # append path
+      end_pos = snap_pos(end_pos, 1)
+      path_data.append("V {} ".format(end_pos[1])) # append path
     elif cmd[0] in key_map['west']:
       end_pos[0] -= length # calc end pos from direction, length, last pos
-      new_path.attrib['d'] += "H {} ".format(end_pos[0]) # append path
+      end_pos = snap_pos(end_pos, 0)
+      path_data.append("H {} ".format(end_pos[0])) # append path
     else:
       print('invalid command')
       return True
+  fit_viewbox(root, end_pos)
+  if log:
+    log.write(cmd+'\n')
+  return True
+
+def fit_viewbox(root: ET.Element, end_pos):
   viewbox = [ float(x) for x in root.attrib['viewBox'].split()] # keep path inside viewBox
   if end_pos[0] <= viewbox[0]:
     viewbox[2] +=  viewbox[0]-(end_pos[0]-1)
@@ -238,9 +532,127 @@ def process_command(root: ET.Element, new_path: ET.Element,cmd: str, scale: floa
   # update size values
   root.attrib['height'] = '{}cm'.format((viewbox[3]-viewbox[1])*100*output_scale)
   root.attrib['width'] = '{}cm'.format((viewbox[2]-viewbox[0])*100*output_scale)
-  if log:
-    log.write(cmd+'\n')
-  return True
+
+def find_layer(root: ET.Element, layer_path: str) -> ET.Element:
+  layer_root = root
+  for layer_frag in layer_path.split('/'): # locate layer in tree or add it
+    if layer_frag == '': continue
+    next_layer = layer_root.find('./g[@inkscape:groupmode="layer"][@inkscape:label="{}"]'.format(layer_frag), ns)
+    if next_layer is None:
+      new_layer = ET.SubElement(layer_root, 'g', {'{http://www.inkscape.org/namespaces/inkscape}groupmode': "layer",
+      "{http://www.inkscape.org/namespaces/inkscape}label": layer_frag, 'style': "display:inline"}) # add layer
+      layer_root = new_layer
+    else:
+      layer_root = next_layer
+  return layer_root
+
+def command_steps(cmd: str):
+  # a drawing command as (kind, angle, length, turn) for batch mode, or None if it doesn't draw
+  if len(cmd) == 0:
+    return None
+  if not cmd[0].isalpha():
+    for kind, key in [('L', 'angle'), ('M', 'move')]:
+      args = cmd.split(key_map[key][0])
+      if len(args) == 2 and valid_num(args[0]) and valid_num(args[1]):
+        return kind, float(args[0]), float(args[1]), 0
+    return None
+  if cmd[0] in key_map['curve']:
+    args = cmd[1:].split(',')
+    if len(args) == 2 and valid_num(args[0]) and valid_num(args[1]):
+      return 'Q', 0, float(args[0]), float(args[1])
+    return None
+  # headings as the path model reads them back from the drawn segments
+  for kind, angle, key in [('V', 0, 'north'), ('H', 90, 'east'), ('V', 180, 'south'), ('H', -90, 'west')]:
+    if cmd[0] in key_map[key] and valid_num(cmd[1:]):
+      return kind, angle, float(cmd[1:]), 0
+  return None
+
+def read_batch_file(name: str):
+  # the drawing steps of a command log, or of a CSV survey of angle,length[,move] rows
+  steps = []
+  with open(name, newline='') as file:
+    if name.lower().endswith('.csv'):
+      for row in csv.reader(file):
+        if len(row) < 2 or not valid_num(row[0]) or not valid_num(row[1]):
+          continue # header or blank row
+        move = len(row) > 2 and row[2].strip().lower() in ['1', 'y', 'yes', 'true', 'move']
+        steps.append(('M' if move else 'L', float(row[0]), float(row[1]), 0))
+      return steps
+    for line_no, cmd in enumerate(file, 1):
+      cmd = cmd.strip()
+      if cmd == '' or cmd[0] in key_map['save'] + key_map['print'] + key_map['help'] + key_map['simplify']:
+        continue
+      if cmd[0] in key_map['quit']:
+        break
+      if cmd[0] in key_map['undo']:
+        if steps:
+          steps.pop()
+        continue
+      step = command_steps(cmd)
+      if step is None:
+        print('{}:{}: invalid command {}'.format(name, line_no, cmd))
+        continue
+      steps.append(step)
+  return steps
+
+def batch_path_data(steps, start, scale):
+  # the d attribute and end positions of a path, with every position from cumulative sums
+  import numpy as np # only needed in batch mode
+  if not steps:
+    return "M {0[0]},{0[1]} ".format(start), [tuple(start)]
+  kinds = np.array([step[0] for step in steps])
+  angle, length, turn = (np.array([step[i] for step in steps], dtype=float) for i in (1, 2, 3))
+  curve = kinds == 'Q'
+
+  # the heading after each step is set by lines, reset by moves and turned by curves
+  turns = np.cumsum(np.where(curve, turn, 0))
+  explicit = np.where(kinds == 'M', 0, angle) - turns
+  last_set = np.maximum.accumulate(np.where(curve, -1, np.arange(len(steps))))
+  heading = turns + np.where(last_set >= 0, explicit[last_set], 0)
+  before = np.concatenate([[0], heading[:-1]])
+
+  # a curve is two moves of its radius, to the control point then to the end point
+  counts = np.where(curve, 2, 1)
+  rows = np.repeat(np.arange(len(steps)), counts)
+  second = np.concatenate([[False], rows[1:] == rows[:-1]])
+  direction = np.radians(np.where(curve[rows], before[rows] + np.where(second, turn[rows], 0), angle[rows]))
+  distance = scale * length[rows]
+  dx = np.where(kinds[rows] == 'V', 0, distance * np.sin(direction))
+  dy = np.where(kinds[rows] == 'H', 0, -distance * np.cos(direction))
+  xs = (start[0] + np.cumsum(dx)).tolist()
+  ys = (start[1] + np.cumsum(dy)).tolist()
+
+  segments = ["M {0[0]},{0[1]} ".format(start)]
+  ends = (np.cumsum(counts) - 1).tolist()
+  for (kind, *_), end in zip(steps, ends):
+    if kind == 'V':
+      segments.append("V {} ".format(ys[end]))
+    elif kind == 'H':
+      segments.append("H {} ".format(xs[end]))
+    elif kind == 'Q':
+      segments.append("Q {} {} {} {} ".format(xs[end-1], ys[end-1], xs[end], ys[end]))
+    else:
+      segments.append("{} {} {} ".format(kind, xs[end], ys[end]))
+  return ''.join(segments), [(xs[end], ys[end]) for end in ends]
+
+def batch_paths(root: ET.Element, batch_files, scale: float):
+  start = [arg_list.x or 0, arg_list.y or 0]
+  for batch_file in batch_files:
+    name, _, layer_path = batch_file.partition('@')
+    d, ends = batch_path_data(read_batch_file(name), start, scale)
+    if arg_list.simplify:
+      path = PathData(d)
+      removed, total = path.simplify(arg_list.simplify)
+      d = path.d()
+      print('{}: removed {} of {} vertices'.format(name, removed, total))
+    ET.SubElement(find_layer(root, layer_path or arg_list.layer or ''), 'path', {
+      'style': "fill:none;stroke:#000000;stroke-width:0.5;stroke-linecap:butt;stroke-linejoin:butt;",
+      'd': d,
+      '{http://www.inkscape.org/namespaces/inkscape}label': os.path.splitext(os.path.basename(name))[0],
+    })
+    fit_viewbox(root, [min(x for x, _ in ends), min(y for _, y in ends)])
+    fit_viewbox(root, [max(x for x, _ in ends), max(y for _, y in ends)])
+    print('{}: {} segments'.format(name, len(ends)))
 
 if arg_list.input:
   with open(arg_list.input,'r') as file:
@@ -273,7 +685,14 @@ else:
 svg_name = arg_list.output # set svg name
 tmp_name = 'svg_tmp'+'.html' # gen temp svg name
 
-if not arg_list.args:
+if arg_list.args or arg_list.batch:
+  pass
+elif arg_list.serve is not None:
+  preview_server = ThreadingHTTPServer(('localhost', arg_list.serve), PreviewHandler)
+  preview_server.daemon_threads = True
+  threading.Thread(target=preview_server.serve_forever, daemon=True).start()
+  print('live preview available at http://localhost:{}/, please open this in a browser'.format(arg_list.serve))
+else:
   preview_wrapper = '<!DOCTYPE html><html><meta http-equiv="refresh" content="2"/><style>svg {display:block; position:fixed;top:0; left:0; width:100%; height:100%;}</style></html>'
   preview_vector = ET.fromstring(preview_wrapper) # wrap in html autoload tags
   preview_vector.append(root)
@@ -295,8 +714,7 @@ try:
       units_scale = float(scale_segments[1])
     else:
       print('Invalid scale format')
-      if not arg_list.args:
-        os.remove(tmp_name) # remove tmp file
+      remove_preview()
       exit(1)
 
   else:
@@ -304,20 +722,18 @@ try:
     dist_scale = float(input('Set the actual distance for scale: ')) # get scale distance
   scale = dist_scale/units_scale
 
+  if arg_list.batch:
+    batch_paths(root, arg_list.batch, scale)
+    ET.ElementTree(root).write(svg_name,xml_declaration=True,encoding='UTF-8') # save svg
+    exit(0)
+
   if arg_list.layer:
     layer_path = arg_list.layer
   else:
     layer_path = input('Enter layer path, use / as the delimiter: ') # get layer
-  layer_root = root
-  for layer_frag in layer_path.split('/'): # locate layer in tree or add it
-    if layer_frag == '': continue
-    next_layer = layer_root.find('./g[@inkscape:groupmode="layer"][@inkscape:label="{}"]'.format(layer_frag), ns)
-    if next_layer is None:
-      new_layer = ET.SubElement(layer_root, 'g', {'{http://www.inkscape.org/namespaces/inkscape}groupmode': "layer",
-      "{http://www.inkscape.org/namespaces/inkscape}label": layer_frag, 'style': "display:inline"}) # add layer
-      layer_root = new_layer
-    else:
-      layer_root = next_layer
+  layer_root = find_layer(root, layer_path)
+  if arg_list.snap:
+    snap_index = build_snap_index(root, layer_root, arg_list.snap)
   if arg_list.path:
     active_path = layer_root.find('./path[@id="{}"]'.format(arg_list.path), ns)
     if active_path is None:
@@ -331,6 +747,7 @@ try:
       else:
         print('Invalid coordinates')
         exit(2)
+      end_pos = snap_pos(end_pos)
       new_path = ET.SubElement(layer_root, 'path',{
         'style': "fill:none;stroke:#000000;stroke-width:0.5;stroke-linecap:butt;stroke-linejoin:butt;",
         'd': "M {0[0]},{0[1]} ".format(end_pos)
@@ -339,8 +756,8 @@ try:
         new_path.attrib['{http://www.inkscape.org/namespaces/inkscape}label'] = arg_list.path
     else:
       new_path = active_path
-      active_path.attrib['d'] += ' '
-      end_pos = calc_path_data(active_path.attrib['d'])[0]
+    path_data = PathData(new_path.attrib['d'])
+    end_pos = path_data.pos
   layer_root.append(ET.Comment('Scaling values used {}/{} Scale factor = {}'.format(dist_scale,units_scale,scale)))
   if arg_list.log:
     log = open(arg_list.log,'a')
@@ -352,8 +769,13 @@ try:
     print('type h for help')
     while 1:
       cmd = input('cmd> ') # read in next direction and length
-      if not process_command(root, new_path, cmd, scale, log):
-        break
+      with preview_lock:
+        if not process_command(root, new_path, cmd, scale, log):
+          break
+      if arg_list.serve is not None:
+        push_preview(root, path_data.d())
+        continue
+      new_path.attrib['d'] = path_data.d()
       preview_vector = ET.fromstring(preview_wrapper) # wrap in html autoload tags
       preview_vector.append(root)
       ET.ElementTree(preview_vector).write(tmp_name,method='html') # output to temp file
@@ -364,8 +786,8 @@ except KeyboardInterrupt:
     log.close()
   ans = input('Would you like to save before exiting? (y/n)').lower()
   if ans in ['n','no']:
-    os.remove(tmp_name) # remove tmp file
+    remove_preview()
     exit(0)
+new_path.attrib['d'] = path_data.d()
 ET.ElementTree(root).write(svg_name,xml_declaration=True,encoding='UTF-8') # save svg
-if not arg_list.args:
-  os.remove(tmp_name) # remove tmp file
\ No newline at end of file
+remove_preview()
\ No newline at end of file
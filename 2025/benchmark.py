@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+import io
+import os
+import copy
+import json
+import time
+import argparse
+import platform
+import importlib
+import tempfile
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from contextlib import redirect_stdout
+
+import yaml
+
+from generate_svg import (
+    INKSCAPE_NS, SVG_NS, _config_cache, _embed_cache, _template_cache, _template_contents, embed_svg, find_teams,
+    generate_svg, index_layers, index_placeholders, insert_tlas, load_config, load_template, parse_svg, print_layers,
+)
+
+insert_tla_list = importlib.import_module('populate-map').insert_tla_list
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+YEARS = ['2019', '2022', '2023', '2024', '2025']
+REAL_ELEMENTS = 560  # roughly the element count of a real level plan, e.g. 2025/templates/L3.svg
+LAYER_NAMES = ['General', 'Areas', 'Network', 'Power', 'Dimensions', 'Shepherding']
+
+
+def timed(run, setup=lambda: None, repeat=3):
+    # best of `repeat` runs, with any per-run setup (e.g. copying a tree) excluded from the timing
+    best = None
+    for _ in range(repeat):
+        arg = setup()
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            start = time.perf_counter()
+            run(arg)
+            duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+
+    return best
+
+
+def clear_caches():
+    _config_cache.clear()
+    _template_cache.clear()
+    _template_contents.clear()
+    _embed_cache.clear()
+
+
+def bench_spec(case, spec_path, template_dir, teams_file, repeat):
+    spec = load_config(spec_path)
+    svg_file = Path(template_dir) / spec['image']
+    teams = load_config(teams_file) if teams_file else {}
+
+    tree, ns = parse_svg(svg_file)
+    root = tree.getroot()
+    layers = index_layers(root, ns)
+    placeholders = index_placeholders(root, ns)
+
+    def fresh_root():
+        return copy.deepcopy(root)
+
+    phases = {
+        'parse': timed(lambda _: parse_svg(svg_file), repeat=repeat),
+        'index': timed(lambda _: (index_layers(root, ns), index_placeholders(root, ns)), repeat=repeat),
+        'copy': timed(lambda _: copy.deepcopy(root), repeat=repeat),
+        'print_layers': timed(
+            lambda r: print_layers(r, layers, spec.get('show', ['ALL']), spec.get('hide', [])),
+            fresh_root, repeat=repeat,
+        ),
+        'insert_tlas': timed(lambda r: insert_tlas(r, teams, placeholders), fresh_root, repeat=repeat),
+    }
+
+    for embedded in spec.get('embed', []):
+        load_template(Path(template_dir) / embedded['image'])  # warm the cache
+        phases[f"embed_svg {embedded['image']}"] = timed(
+            lambda r: embed_svg(embedded, r, ns, template_dir, teams),
+            fresh_root, repeat=repeat,
+        )
+
+    phases['write'] = timed(
+        lambda r: ET.ElementTree(r).write(io.BytesIO(), xml_declaration=True, encoding='UTF-8'),
+        fresh_root, repeat=repeat,
+    )
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        phases['generate_svg'] = timed(
+            lambda _: generate_svg(spec_path, template_dir, out_dir, 100, teams_file=teams_file),
+            clear_caches, repeat=repeat,
+        )
+
+    elements = sum(1 for _ in root.iter())
+    return [
+        {'case': case, 'phase': phase, 'seconds': seconds, 'elements': elements}
+        for phase, seconds in phases.items()
+    ]
+
+
+def bench_map(case, svg_file, teams_file, repeat):
+    tree, ns = parse_svg(svg_file)
+    root = tree.getroot()
+    teams = load_config(teams_file)
+
+    return [{
+        'case': case,
+        'phase': 'insert_tla_list',
+        'seconds': timed(lambda r: insert_tla_list(r, teams, ns), lambda: copy.deepcopy(root), repeat=repeat),
+        'elements': sum(1 for _ in root.iter()),
+    }]
+
+
+def synthetic_layer(root, name, depth, paths):
+    # a chain of `depth` nested sublayers, with the paths spread between them
+    parent = root
+    for level in range(depth):
+        parent = ET.SubElement(parent, f'{{{SVG_NS}}}g', {
+            f'{{{INKSCAPE_NS}}}groupmode': 'layer',
+            f'{{{INKSCAPE_NS}}}label': name if level == 0 else f'{name}{level}',
+        })
+        for idx in range(paths // depth):
+            ET.SubElement(parent, f'{{{SVG_NS}}}path', {
+                'd': f'M {idx},{level} H {idx + 10.123456} V {level + 5.654321} Z',
+                'style': 'fill:none;stroke:#000000;stroke-width:0.5',
+            })
+
+
+def synthetic_template(path, factor, depth):
+    # a template with about `factor` times the elements of a real level plan
+    root = ET.Element(f'{{{SVG_NS}}}svg', {
+        'width': '297mm', 'height': '210mm', 'viewBox': '0 0 297 210',
+    })
+    for placeholder in ['{{title}}', '{{version}}', '{{scale}}']:
+        text = ET.SubElement(root, f'{{{SVG_NS}}}text')
+        ET.SubElement(text, f'{{{SVG_NS}}}tspan').text = placeholder
+    ET.SubElement(root, f'{{{SVG_NS}}}rect', {
+        'id': 'KEY__', 'x': '0', 'y': '0', 'width': '50', 'height': '50',
+    })
+
+    elements = REAL_ELEMENTS * factor
+    for name in LAYER_NAMES:
+        synthetic_layer(root, name, depth, elements // (2 * len(LAYER_NAMES)))
+
+    slots = elements // 6
+    tla = ET.SubElement(root, f'{{{SVG_NS}}}g', {
+        f'{{{INKSCAPE_NS}}}groupmode': 'layer', f'{{{INKSCAPE_NS}}}label': 'TLA',
+    })
+    for team_no in range(1, slots + 1):
+        for placeholder in [f'@T_{team_no}', f'@t_{team_no}', f'@I_{team_no}']:
+            text = ET.SubElement(tla, f'{{{SVG_NS}}}text', {'x': str(team_no % 297), 'y': str(team_no % 210)})
+            ET.SubElement(text, f'{{{SVG_NS}}}tspan').text = placeholder
+
+    ET.ElementTree(root).write(path, xml_declaration=True, encoding='UTF-8')
+    return slots
+
+
+def bench_synthetic(factor, depth, repeat):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        slots = synthetic_template(tmp_dir / 'synthetic.svg', factor, depth)
+        (tmp_dir / 'key.svg').write_bytes((REPO_DIR / '2025' / 'templates' / 'key.svg').read_bytes())
+
+        teams_file = tmp_dir / 'teams.yaml'
+        teams_file.write_text(yaml.safe_dump({team_no: f'T{team_no:05}' for team_no in range(1, slots + 1)}))
+        spec_file = tmp_dir / 'spec.json'
+        spec_file.write_text(json.dumps({
+            'image': 'synthetic.svg',
+            'title': 'Synthetic',
+            'show': ['General', 'Areas', 'TLA'],
+            'hide': ['General/General1'],
+            'embed': [{'marker': 'KEY__', 'image': 'key.svg', 'show': ['General', 'Areas']}],
+        }))
+
+        case = f'synthetic x{factor}'
+        results += bench_spec(case, spec_file, tmp_dir, teams_file, repeat)
+        results += bench_map(case, tmp_dir / 'synthetic.svg', teams_file, repeat)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each phase of generate_svg and populate-map")
+    parser.add_argument('-o', '--output', type=Path, default=Path('output/benchmark.json'), help=(
+        "The JSON file to write the results to, defaults to '%(default)s'"
+    ))
+    parser.add_argument('--years', nargs='*', default=YEARS, help=(
+        "The years whose layouts are benchmarked, defaults to %(default)s"
+    ))
+    parser.add_argument('--scales', type=int, nargs='*', default=[10, 100, 1000], help=(
+        "Sizes of the synthetic templates, as multiples of a real level plan, defaults to %(default)s"
+    ))
+    parser.add_argument('--depth', type=int, default=8, help=(
+        "Layer nesting depth of the synthetic templates, defaults to %(default)s"
+    ))
+    parser.add_argument('-r', '--repeat', type=int, default=3, help=(
+        "Number of runs per phase, the fastest is reported, defaults to %(default)s"
+    ))
+
+    args = parser.parse_args()
+
+    results = []
+    for year in args.years:
+        year_dir = REPO_DIR / year
+        teams_file = find_teams(year_dir)
+        for spec_path in sorted((year_dir / 'layouts').iterdir()):
+            print(f"Benchmarking {year}/{spec_path.name}")
+            results += bench_spec(f'{year}/{spec_path.name}', spec_path, year_dir / 'templates', teams_file, args.repeat)
+
+        if (year_dir / 'templates' / 'map.svg').exists() and teams_file:
+            print(f"Benchmarking {year}/map.svg")
+            results += bench_map(f'{year}/map.svg', year_dir / 'templates' / 'map.svg', teams_file, args.repeat)
+
+    for factor in args.scales:
+        print(f"Benchmarking synthetic template x{factor}")
+        results += bench_synthetic(factor, args.depth, args.repeat)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w') as file:
+        json.dump({
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'repeat': args.repeat,
+            'results': results,
+        }, file, indent=2)
+
+    totals = {}
+    for result in results:
+        totals[result['phase'].split()[0]] = totals.get(result['phase'].split()[0], 0) + result['seconds']
+    for phase, seconds in sorted(totals.items(), key=lambda item: -item[1]):
+        print(f"{seconds:10.4f}s  {phase}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+import time
+import queue
+import argparse
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+PROMPT = b'> '
+
+
+class InkscapeShell:
+    # a persistent `inkscape --shell` session, so Inkscape only starts once for many exports
+    def __init__(self, inkscape='inkscape'):
+        self.process = subprocess.Popen(
+            [inkscape, '--shell'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0,
+        )
+        self.read_until_prompt()
+
+    def read_until_prompt(self):
+        output = bytearray()
+        while not output.endswith(PROMPT):
+            char = self.process.stdout.read(1)
+            if not char:
+                raise RuntimeError("Inkscape shell exited unexpectedly")
+            output += char
+
+        return output[:-len(PROMPT)].decode(errors='replace')
+
+    def run(self, actions):
+        self.process.stdin.write(('; '.join(actions) + '\n').encode())
+        return self.read_until_prompt()
+
+    def close(self):
+        if not self.process.stdin.closed:
+            self.process.stdin.write(b'quit\n')
+            self.process.stdin.close()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def export_actions(svg_file, types, dpi):
+    actions = [f'file-open:{svg_file}', f'export-dpi:{dpi}']
+    for export_type in types:
+        actions += [
+            f'export-type:{export_type}',
+            f'export-filename:{svg_file.with_suffix("." + export_type)}',
+            'export-do',
+        ]
+    actions.append('file-close')
+
+    return actions
+
+
+def export_file(shell, svg_file, types, dpi):
+    start = time.perf_counter()
+    shell.run(export_actions(svg_file, types, dpi))
+    duration = time.perf_counter() - start
+
+    missing = [
+        export_type for export_type in types
+        if not svg_file.with_suffix('.' + export_type).exists()
+        or svg_file.with_suffix('.' + export_type).stat().st_mtime < svg_file.stat().st_mtime
+    ]
+    return svg_file, duration, missing
+
+
+def export_svgs(svg_files, types, dpi, jobs=1, inkscape='inkscape'):
+    # share the files between a small pool of shell sessions, each owned by one thread
+    files = queue.SimpleQueue()
+    for svg_file in svg_files:
+        files.put(svg_file)
+
+    def worker():
+        results = []
+        shell = InkscapeShell(inkscape)
+        try:
+            while True:
+                try:
+                    svg_file = files.get_nowait()
+                except queue.Empty:
+                    break
+                results.append(export_file(shell, svg_file, types, dpi))
+        finally:
+            shell.close()
+
+        return results
+
+    jobs = max(1, min(jobs, len(svg_files)))
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        workers = [executor.submit(worker) for _ in range(jobs)]
+        results = [result for future in workers for result in future.result()]
+
+    return sorted(results)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('svgs', type=Path, nargs='*', default=[Path('output/')], help=(
+        "SVG files, or folders of SVG files, to export, defaults to 'output/'"
+    ))
+    parser.add_argument('--type', default='pdf,png', help=(
+        "Comma separated list of formats to export, defaults to '%(default)s'"
+    ))
+    parser.add_argument('--dpi', type=int, default=192, help=(
+        "Resolution of raster exports, defaults to %(default)s"
+    ))
+    parser.add_argument('-j', '--jobs', type=int, default=1, help=(
+        "Number of Inkscape shell sessions to run in parallel, defaults to %(default)s"
+    ))
+    parser.add_argument('--inkscape', default='inkscape', help=(
+        "The Inkscape executable, defaults to '%(default)s'"
+    ))
+
+    args = parser.parse_args()
+
+    svg_files = []
+    for svg in args.svgs:
+        if svg.is_dir():
+            svg_files.extend(sorted(svg.glob('*.svg')))
+        else:
+            svg_files.append(svg)
+    svg_files = [svg_file.resolve() for svg_file in svg_files]
+    types = [export_type.strip() for export_type in args.type.split(',') if export_type.strip()]
+
+    start = time.perf_counter()
+    results = export_svgs(svg_files, types, args.dpi, jobs=args.jobs, inkscape=args.inkscape)
+
+    failed = []
+    for svg_file, duration, missing in results:
+        if missing:
+            failed.append(svg_file)
+            print(f"{duration:8.2f}s  {svg_file.name}  failed to export {', '.join(missing)}")
+        else:
+            print(f"{duration:8.2f}s  {svg_file.name}")
+    print(f"Exported {len(results) - len(failed)} of {len(results)} files in {time.perf_counter() - start:.2f}s")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
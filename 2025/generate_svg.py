@@ -1,73 +1,276 @@
 #!/usr/bin/env python3
 
+import io
+import os
 import re
+import copy
+import gzip
+import math
+import sys
 import json
+import time
+import cProfile
+import hashlib
 import argparse
+import importlib.util
+import traceback
+import tracemalloc
+import xml.sax
 import xml.etree.ElementTree as ET
 from pathlib import Path
-from contextlib import suppress
+from functools import partial
+from xml.sax.handler import ContentHandler, feature_namespaces
+from collections import Counter, namedtuple
+from contextlib import ExitStack, contextmanager, suppress, redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
 
-import yaml
 
+def lazy_import(name):
+    # defer loading a slow module until it is first used, so --help and no-op builds start quickly
+    module = sys.modules.get(name)
+    if module is None:
+        spec = importlib.util.find_spec(name)
+        spec.loader = importlib.util.LazyLoader(spec.loader)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
 
-def register_xml_namespaces(xml_file):
-    with open(xml_file, 'r') as file:
-        ns = dict([node for _, node in ET.iterparse(file, events=['start-ns'])])
+    return module
+
+
+yaml = lazy_import('yaml')
+saxutils = lazy_import('xml.sax.saxutils')
+
+
+def parse_svg(xml_file):
+    # build the tree and collect the namespace declarations in a single pass
+    ns = {}
+    with open(xml_file, 'rb') as file:
+        parser = ET.iterparse(file, events=['start-ns'])
+        for _, (prefix, uri) in parser:
+            ns[prefix] = uri
+        root = parser.root
 
     for prefix in ns:
         ET.register_namespace(prefix, ns[prefix])
 
-    return ns
+    return ET.ElementTree(root), ns
+
+
+MANIFEST_FILE = '.manifest.json'
+
+SVG_NS = 'http://www.w3.org/2000/svg'
+INKSCAPE_NS = 'http://www.inkscape.org/namespaces/inkscape'
+XLINK_NS = 'http://www.w3.org/1999/xlink'
+SODIPODI_NS = 'http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd'
+
+COMPACT_TOLERANCE_MM = 0.01  # the smallest printed detail kept when compacting
+UNIT_MM = {'mm': 1, 'cm': 10, 'in': 25.4, 'pt': 25.4 / 72, 'pc': 25.4 / 6, 'px': 25.4 / 96}
+NUMBER_RE = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+TEXT_TAGS = {f'{{{SVG_NS}}}{tag}' for tag in ['text', 'tspan', 'textPath', 'title', 'desc', 'flowRoot', 'flowPara']}
+COMPRESSED_SUFFIXES = {'svgz': '.svgz', 'gz': '.svg.gz', 'br': '.svg.br'}
+PATH_ARITY = {'M': 2, 'L': 2, 'T': 2, 'H': 1, 'V': 1, 'C': 6, 'S': 4, 'Q': 4, 'A': 7, 'Z': 0}
+
+# parsed templates, keyed by resolved path and by content hash, so identical copies
+# of a template (e.g. key.svg in each year) are only parsed once
+_template_cache = {}
+_template_contents = {}
+
+Template = namedtuple('Template', ['mtime', 'tree', 'ns', 'layers', 'placeholders'])
+
+
+def cached_template(svg_file):
+    # parse and index each template at most once per run, the result is shared so must not be modified
+    svg_file = Path(svg_file).resolve()
+    mtime = svg_file.stat().st_mtime_ns
+
+    cached = _template_cache.get(svg_file)
+    if cached is None or cached.mtime != mtime:
+        digest = file_hash(svg_file)
+        cached = _template_contents.get(digest)
+        if cached is None:
+            tree, ns = parse_svg(svg_file)
+            root = tree.getroot()
+            cached = Template(mtime, tree, ns, index_layers(root, ns), index_placeholders(root, ns))
+            _template_contents[digest] = cached
+        else:
+            for prefix in cached.ns:
+                ET.register_namespace(prefix, cached.ns[prefix])
+
+        cached = cached._replace(mtime=mtime)
+        replaced = _template_cache.get(svg_file)
+        _template_cache[svg_file] = cached
+        if replaced is not None and not any(other.tree is replaced.tree for other in _template_cache.values()):
+            # no other path has the old contents, so drop them rather than keep every saved version
+            for stale in [digest for digest, other in _template_contents.items() if other.tree is replaced.tree]:
+                del _template_contents[stale]
+
+    return cached
+
+
+def load_template(svg_file):
+    # a private copy of a cached template
+    cached = cached_template(svg_file)
+    return cached._replace(tree=ET.ElementTree(copy.deepcopy(cached.tree.getroot())), ns=dict(cached.ns))
+
+
+def yaml_loader():
+    # the libyaml parser is much faster, when PyYAML was built with it
+    return getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# parsed configs, keyed by resolved path, holding (mtime, config)
+_config_cache = {}
 
 
 def load_config(conf_file):
-    try:
-        with open(conf_file, 'r') as file:
-            conf = json.load(file)  # load json specification
-    except json.JSONDecodeError:
-        print(f"Failed to read {conf_file} as JSON, trying YAML")
+    # parse each config at most once per run, choosing the format from the file extension
+    conf_file = Path(conf_file)
+    key = conf_file.resolve()
+    mtime = key.stat().st_mtime_ns
+
+    cached = _config_cache.get(key)
+    if cached is None or cached[0] != mtime:
         with open(conf_file, 'r') as file:
-            conf = yaml.safe_load(file)  # load yaml specification
+            text = file.read()
 
-    return conf
+        suffix = conf_file.suffix.lower()
+        if suffix == '.json':
+            conf = json.loads(text)  # load json specification
+        elif suffix in ['.yaml', '.yml']:
+            conf = yaml.load(text, Loader=yaml_loader())  # load yaml specification
+        else:
+            try:
+                conf = json.loads(text)
+            except json.JSONDecodeError:
+                print(f"Failed to read {conf_file} as JSON, trying YAML")
+                conf = yaml.load(text, Loader=yaml_loader())
 
+        cached = (mtime, conf)
+        _config_cache[key] = cached
 
-def print_layers(
-    root, show=[], hide=[],
-    ns={
-        'svg': 'http://www.w3.org/2000/svg',
-        'inkscape': 'http://www.inkscape.org/namespaces/inkscape'
-    },
-    prefix="", autoshow=False
-):
-    if prefix:
-        prefix += '/'
+    return copy.deepcopy(cached[1])
+
+
+# per-phase timing and memory records, only collected while profiling
+_profile_records = None
+_profile_stack = []
+_profile_cleared = 0  # bytes traced before the last clear_traces, on Pythons without reset_peak
+
+
+def traced_memory():
+    # the current and peak traced bytes, counting those from before any clear_traces
+    current, peak = tracemalloc.get_traced_memory()
+    return current + _profile_cleared, peak + _profile_cleared
+
+
+def reset_traced_peak():
+    # reset_peak needs Python 3.9, before that clearing the traces is the only way to reset the peak
+    global _profile_cleared
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    else:
+        _profile_cleared = traced_memory()[0]
+        tracemalloc.clear_traces()
+
+
+@contextmanager
+def profile_phase(name):
+    if _profile_records is None:
+        yield
+        return
+
+    # nested phases reset the tracemalloc peak, so carry each child's peak up to its parent
+    if _profile_stack:
+        _profile_stack[-1]['peak'] = max(_profile_stack[-1]['peak'], traced_memory()[1])
+    reset_traced_peak()
+    frame = {'name': name, 'peak': 0, 'memory': traced_memory()[0]}
+    _profile_stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        _profile_stack.pop()
+        peak = max(frame['peak'], traced_memory()[1])
+        if _profile_stack:
+            _profile_stack[-1]['peak'] = max(_profile_stack[-1]['peak'], peak)
+
+        _profile_records.append({
+            'phase': '/'.join([*(parent['name'] for parent in _profile_stack), name]),
+            'seconds': duration,
+            'peak_bytes': peak - frame['memory'],
+        })
+
+
+def profile_call(func, *args, **kwargs):
+    # run func while recording its phases, returning the records
+    global _profile_records, _profile_cleared
+    _profile_records = []
+    _profile_cleared = 0
+    tracemalloc.start()
+    try:
+        with profile_phase('total'):
+            func(*args, **kwargs)
+    finally:
+        tracemalloc.stop()
+        records, _profile_records = _profile_records, None
+
+    return records
+
+
+def index_layers(root, ns, prefix="", position=()):
+    # list each layer's full label path with its child-index position, in nesting order
+    layers = []
+    for idx, child in enumerate(root):
+        if child.tag != f'{{{ns["svg"]}}}g' or child.get(f'{{{ns["inkscape"]}}}groupmode') != 'layer':
+            continue
 
-    for child in root.findall('./svg:g[@inkscape:groupmode="layer"]', ns):
         label = prefix + child.get(f'{{{ns["inkscape"]}}}label', "")
+        layers.append((label, position + (idx,)))
+        layers.extend(index_layers(child, ns, label + '/', position + (idx,)))
 
-        if autoshow:
-            if label in hide:
-                child.set('style', 'display:none')
-                print(f'Hide: {label}')
-            else:
-                child.attrib.pop('style', None)
-                print(f'Show: {label}')
-        else:
-            if label in hide:
-                child.set('style', 'display:none')
-                print(f'Hide: {label}')
-            elif label in show or 'ALL' in show:
-                child.attrib.pop('style', None)
-                print(f'Show: {label}')
-                child = print_layers(child, show, hide, ns, prefix=label, autoshow=True)
-            else:
-                child.set('style', 'display:none')
-                print(f'Hide: {label}')
+    return layers
+
+
+def element_at(root, position):
+    for idx in position:
+        root = root[idx]
 
     return root
 
 
+def print_layers(root, layers, show=[], hide=[]):
+    # top level layers are shown if listed (or ALL), their direct sublayers are shown unless hidden
+    shown = set()
+    for label, position in layers:
+        autoshow = len(position) == 2
+        if len(position) > 2 or (autoshow and position[:-1] not in shown):
+            continue
+
+        child = element_at(root, position)
+        if label not in hide and (autoshow or label in show or 'ALL' in show):
+            child.attrib.pop('style', None)
+            print(f'Show: {label}')
+            shown.add(position)
+        else:
+            child.set('style', 'display:none')
+            print(f'Hide: {label}')
+
+    unknown = unknown_layers(layers, show, hide)
+    for label in unknown:
+        print(f'Unknown layer: {label}')
+
+    return unknown
+
+
+def unknown_layers(layers, show=[], hide=[]):
+    labels = {label for label, _ in layers}
+    return [label for label in [*show, *hide] if label != 'ALL' and label not in labels]
+
+
+TITLE_SLOTS = ['{{title}}', '{{version}}', '{{scale}}']
+
+
 def set_titles(root, title, version, scale, ns):
     with suppress(IndexError, AttributeError, TypeError):
         root.find('.//svg:text[svg:tspan="{{title}}"]', ns)[0].text = title
@@ -79,47 +282,193 @@ def set_titles(root, title, version, scale, ns):
     return root
 
 
-def insert_tlas(svg_root, teams, ns):
-    TLA = svg_root.find('svg:g[@inkscape:label="TLA"]', ns)  # add team names
-    if TLA:
-        for team in TLA.findall('.//svg:text/svg:tspan', ns):
-            team_no = re.search(r'@T_(\d+)', team.text)
+def index_placeholders(root, ns):
+    # map each @T_n team number to the positions of its tspans in the TLA layer
+    placeholders = {}
+    for tla_idx, TLA in enumerate(root):
+        if TLA.tag == f'{{{ns["svg"]}}}g' and TLA.get(f'{{{ns["inkscape"]}}}label') == 'TLA':
+            break
+    else:
+        return placeholders
+
+    stack = [((tla_idx,), TLA)]
+    while stack:
+        position, element = stack.pop()
+        for idx, child in enumerate(element):
+            stack.append((position + (idx,), child))
+            if element.tag != f'{{{ns["svg"]}}}text' or child.tag != f'{{{ns["svg"]}}}tspan':
+                continue
+
+            team_no = re.search(r'@T_(\d+)', child.text or '')
             if team_no is not None:
-                team.text = teams.get(int(team_no[1]), '')
+                placeholders.setdefault(int(team_no[1]), []).append(position + (idx,))
 
-    return svg_root
+    return placeholders
 
 
-def embed_svg(embedded, root, ns, template_dir, team_names=None):
-    print(f"Embedding {embedded['image']}")
-    embedded_root = ET.parse(Path(template_dir) / embedded['image']).getroot()  # load svg
+def insert_tlas(svg_root, teams, placeholders):
+    missing = []
+    for team_no, positions in sorted(placeholders.items()):
+        if team_no not in teams:
+            missing.append(team_no)
+            print(f"No team for placeholder @T_{team_no}")
 
-    if team_names is not None:
-        embedded_root = insert_tlas(embedded_root, team_names, ns)
+        for position in positions:
+            element_at(svg_root, position).text = teams.get(team_no, '')
 
-    # display only selected layers or ALL
-    embedded_root = print_layers(
-        embedded_root,
-        embedded.get('show', ['ALL']),
-        embedded.get('hide', []),
-        ns=ns,
+    return missing
+
+
+def report_team_coverage(specs, template_dir, teams):
+    # list the teams that have no placeholder in any template used by the specs
+    images = set()
+    for spec in specs:
+        with suppress(OSError, KeyError, TypeError, yaml.YAMLError):
+            images.update(spec_images(load_config(spec)))
+
+    placed = set()
+    for image in sorted(images):
+        with suppress(OSError, ET.ParseError):
+            placed.update(load_template(Path(template_dir) / image).placeholders)
+
+    unplaced = sorted(team_no for team_no in teams if team_no not in placed)
+    for team_no in unplaced:
+        print(f"No placeholder for team {team_no} ({teams[team_no]})")
+
+    return unplaced
+
+
+def embed_symbol_id(embedded):
+    # embeds of the same image with the same visibility share a symbol
+    key = json.dumps([embedded['image'], embedded.get('show', ['ALL']), embedded.get('hide', [])])
+    return f"embed_{Path(embedded['image']).stem}_{hashlib.sha1(key.encode()).hexdigest()[:8]}"
+
+
+def embed_defs(root, ns):
+    defs = root.find('svg:defs', ns)
+    if defs is None:
+        defs = ET.Element(f'{{{SVG_NS}}}defs')
+        root.insert(0, defs)
+
+    return defs
+
+
+def make_symbol(embedded_root, symbol_id):
+    symbol = ET.Element(f'{{{SVG_NS}}}symbol', {'id': symbol_id})
+    for field in ['viewBox', 'preserveAspectRatio']:
+        if embedded_root.get(field) is not None:
+            symbol.set(field, embedded_root.get(field))
+    symbol.extend(embedded_root)
+
+    return symbol
+
+
+# visibility-resolved embed subtrees, keyed by their variant, mtime and teams, holding (root, log)
+_embed_cache = {}
+
+
+def embedded_subtree(
+    embedded, template_dir, team_names=None, simplify=(), simplify_tolerance=0.05, base_scale=100,
+):
+    # build each distinct embed once, handing out copies; its log is replayed on reuse
+    svg_file = (Path(template_dir) / embedded['image']).resolve()
+    # the embed variant first, then the inputs that change as the template and teams file are edited
+    key = (
+        (
+            svg_file,
+            tuple(sorted(set(embedded.get('show', ['ALL'])))),
+            tuple(sorted(set(embedded.get('hide', [])))),
+            (tuple(simplify), simplify_tolerance, base_scale) if simplify else None,
+        ),
+        svg_file.stat().st_mtime_ns,
+        None if team_names is None else hashlib.sha1(repr(sorted(team_names.items())).encode()).hexdigest(),
     )
 
+    cached = _embed_cache.get(key)
+    if cached is None:
+        log = io.StringIO()
+        with redirect_stdout(log):
+            with profile_phase('load'):
+                template = load_template(svg_file)  # load svg
+                embedded_root = template.tree.getroot()
+
+            if team_names is not None:
+                with profile_phase('tlas'):
+                    insert_tlas(embedded_root, team_names, template.placeholders)
+
+            # display only selected layers or ALL
+            with profile_phase('layers'):
+                print_layers(
+                    embedded_root,
+                    template.layers,
+                    embedded.get('show', ['ALL']),
+                    embedded.get('hide', []),
+                )
+
+            # the template is at the base scale, its own layers are simplified before it is placed
+            simplify_found = simplify_matches(template.layers, simplify)
+            if simplify_found:
+                with profile_phase('simplify'):
+                    tolerance = simplify_tolerance_units(embedded_root, simplify_tolerance, base_scale)
+                    if tolerance is not None:
+                        simplify_layers([
+                            (label, position, element_at(embedded_root, position))
+                            for _, label, position in simplify_found
+                        ], tolerance)
+
+        cached = (embedded_root, log.getvalue())
+        # drop builds from older saves of the template or teams file, so watching does not keep every version
+        for stale in [other for other in _embed_cache if other[0] == key[0]]:
+            del _embed_cache[stale]
+        _embed_cache[key] = cached
+    else:
+        print(f"Reusing embed of {embedded['image']}")
+
+    print(cached[1], end='')
+    return copy.deepcopy(cached[0])
+
+
+def embed_svg(
+    embedded, root, ns, template_dir, team_names=None, symbols=False,
+    simplify=(), simplify_tolerance=0.05, base_scale=100,
+):
+    print(f"Embedding {embedded['image']}")
+    if symbols:
+        symbol_id = embed_symbol_id(embedded)
+        defs = embed_defs(root, ns)
+        existing_symbol = defs.find(f'svg:symbol[@id="{symbol_id}"]', ns)
+
+    if not symbols or existing_symbol is None:
+        embedded_root = embedded_subtree(
+            embedded, template_dir, team_names,
+            simplify=simplify, simplify_tolerance=simplify_tolerance, base_scale=base_scale,
+        )
+
+        if symbols:
+            defs.append(make_symbol(embedded_root, symbol_id))
+    else:
+        print(f"Reusing symbol {symbol_id}")
+
     embed_marker = embedded['marker']
     # get container that we will be inserting into
     embed_parent = root.find(f'.//svg:rect[@id="{embed_marker}"]/..', ns)
     if embed_parent is None:
         print(f"Failed to find the marker {embed_marker}")
-        return
+        return root
 
     # get the element that will be replaced by the embed
     embed_child = embed_parent.find(f'./svg:rect[@id="{embed_marker}"]', ns)
     if embed_child is None:
         print(f"Failed to find the marker {embed_marker}")
-        return
+        return root
 
     embed_index = list(embed_parent).index(embed_child)
 
+    if symbols:
+        # place the shared symbol rather than a copy of the template
+        ET.register_namespace('xlink', XLINK_NS)
+        embedded_root = ET.Element(f'{{{SVG_NS}}}use', {f'{{{XLINK_NS}}}href': f'#{symbol_id}'})
+
     for field in ['x', 'y', 'width', 'height']:  # set x, y, height & width from the placeholder
         embedded_root.set(field, embed_child.get(field))
 
@@ -128,27 +477,537 @@ def embed_svg(embedded, root, ns, template_dir, team_names=None):
     return root
 
 
-def generate_svg(spec_path, template_dir, out_dir, base_scale, teams_file=None):
-    team_names = None
+def is_hidden(element):
+    style = element.get('style', '').replace(' ', '')
+    return element.get('display') == 'none' or 'display:none' in style.split(';')
+
+
+def element_references(element):
+    # ids referenced by url(#id) or href="#id" attributes anywhere in the element
+    for node in element.iter():
+        for name, value in node.attrib.items():
+            yield from re.findall(r'url\(#([^)]+)\)', value)
+            if name.endswith('href') and value.startswith('#'):
+                yield value[1:]
+
+
+def prune_hidden(root):
+    # remove hidden subtrees, keeping any holding an element referenced from elsewhere in the document
+    references = Counter(element_references(root))
+    removed_elements = removed_bytes = 0
+
+    stack = [root]
+    while stack:
+        parent = stack.pop()
+        for child in list(parent):
+            if not is_hidden(child):
+                stack.append(child)
+                continue
+
+            inner_references = Counter(element_references(child))
+            if any(
+                references[node.get('id')] > inner_references[node.get('id')]
+                for node in child.iter() if node.get('id') is not None
+            ):
+                continue
+
+            removed_elements += sum(1 for _ in child.iter())
+            removed_bytes += len(ET.tostring(child, encoding='UTF-8'))
+            parent.remove(child)
+
+    return removed_elements, removed_bytes
+
+
+def format_number(value, decimals):
+    text = f'{value:.{decimals}f}'
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    return '0' if text in ['-0', ''] else text
+
+
+def compact_path(d, decimals):
+    # round path coordinates, compensating relative commands so rounding errors don't accumulate
+    tokens = re.findall(rf'[A-Za-z]|{NUMBER_RE}', d)
+    out = []
+    exact = rounded = start_exact = start_rounded = (0.0, 0.0)
+    idx = 0
+    command = None
+    while idx < len(tokens):
+        if tokens[idx].isalpha():
+            command = tokens[idx]
+            if command.upper() not in PATH_ARITY:
+                return d
+            out.append(command)
+            idx += 1
+            if command.upper() == 'Z':
+                exact, rounded = start_exact, start_rounded
+                continue
+        elif command is None or command.upper() == 'Z':
+            return d
+
+        arity = PATH_ARITY[command.upper()]
+        try:
+            params = [float(token) for token in tokens[idx:idx + arity]]
+        except ValueError:
+            return d
+        if len(params) != arity:
+            return d
+        idx += arity
+
+        relative = command.islower()
+        upper = command.upper()
+        if upper == 'H':
+            points, params = [(params[0], 0.0 if relative else exact[1])], []
+        elif upper == 'V':
+            points, params = [(0.0 if relative else exact[0], params[0])], []
+        elif upper == 'A':
+            points, params = [tuple(params[5:7])], params[:5]
+        else:
+            points, params = list(zip(params[::2], params[1::2])), []
+
+        values = [format_number(value, decimals) for value in params[:3]]
+        values += [format_number(value, 0) for value in params[3:]]  # arc flags
+        for x, y in points:
+            target = (exact[0] + x, exact[1] + y) if relative else (x, y)
+            target_rounded = (round(target[0], decimals), round(target[1], decimals))
+            if relative:
+                delta = [target_rounded[0] - rounded[0], target_rounded[1] - rounded[1]]
+            else:
+                delta = list(target_rounded)
+            values += [format_number(value, decimals) for value in delta]
+        if upper == 'H':
+            del values[-1]
+        elif upper == 'V':
+            del values[-2]
+        out.extend(values)
+
+        exact, rounded = target, target_rounded
+        if upper == 'M':
+            start_exact, start_rounded = exact, rounded
+            command = 'l' if relative else 'L'  # further pairs are implicit linetos
+
+    return ' '.join(out)
+
+
+def compact_transform(transform, decimals):
+    # translations are rounded like coordinates, scaling and rotation keep their relative precision
+    def compact_function(match):
+        name = match[1]
+        values = [float(value) for value in re.findall(NUMBER_RE, match[2])]
+        if name == 'matrix' and len(values) == 6:
+            scaling, translation = values[:4], values[4:]
+            values = [f'{value:.6g}' for value in scaling] + [format_number(value, decimals) for value in translation]
+        elif name == 'translate':
+            values = [format_number(value, decimals) for value in values]
+        elif name == 'rotate':
+            values = [format_number(values[0], 3)] + [format_number(value, decimals) for value in values[1:]]
+        else:
+            values = [f'{value:.6g}' for value in values]
+        return f"{name}({','.join(values)})"
+
+    return re.sub(r'(\w+)\s*\(([^)]*)\)', compact_function, transform)
+
+
+def paper_mm_per_unit(root):
+    # printed millimetres per user unit, from the root's width and viewBox
+    try:
+        width = root.get('width')
+        unit = re.search(r'[a-z]*$', width)[0] or 'px'
+        view_width = float(root.get('viewBox').split()[2])
+        return float(width[:len(width) - len(unit)]) * UNIT_MM[unit] / view_width
+    except (AttributeError, TypeError, ValueError, KeyError, IndexError, ZeroDivisionError):
+        return None
+
+
+def nested_mm_per_unit(svg, parent_mm_per_unit):
+    # printed millimetres per user unit inside a nested <svg>, from its size in the parent's units,
+    # or None if that is unknown
+    if parent_mm_per_unit is None:
+        return None
+    try:
+        view_box = [float(value) for value in svg.get('viewBox').split()]
+        return parent_mm_per_unit * max(
+            float(svg.get('width')) / view_box[2],
+            float(svg.get('height')) / view_box[3],
+        )
+    except (AttributeError, TypeError, ValueError, IndexError, ZeroDivisionError):
+        return None
+
+
+def compact_decimals(mm_per_unit):
+    # decimal places needed for coordinates so that rounding stays under the print tolerance
+    if mm_per_unit is None:
+        return 3
+
+    return max(0, math.ceil(math.log10(mm_per_unit / COMPACT_TOLERANCE_MM)))
+
+
+def compact_svg(root):
+    # drop editor-only elements, attributes and indentation, and round path and transform numbers
+    # to the precision of the viewport they are in, as embedded templates have their own scale
+    root_mm_per_unit = paper_mm_per_unit(root)
+    editor_tags = [f'{{{SODIPODI_NS}}}namedview', f'{{{SVG_NS}}}metadata']
+    keep_attributes = [f'{{{INKSCAPE_NS}}}label', f'{{{INKSCAPE_NS}}}groupmode']
+
+    stack = [(root, compact_decimals(root_mm_per_unit), root_mm_per_unit)]
+    while stack:
+        parent, decimals, mm_per_unit = stack.pop()
+        for child in list(parent):
+            if child.tag in editor_tags:
+                parent.remove(child)
+            else:
+                if parent.tag not in TEXT_TAGS and child.tail is not None and not child.tail.strip():
+                    child.tail = None
+                if child.tag == f'{{{SVG_NS}}}svg':
+                    child_mm_per_unit = nested_mm_per_unit(child, mm_per_unit)
+                    child_decimals = None if child_mm_per_unit is None else compact_decimals(child_mm_per_unit)
+                    stack.append((child, child_decimals, child_mm_per_unit))
+                elif child.tag == f'{{{SVG_NS}}}symbol':
+                    stack.append((child, None, None))  # its scale depends on each <use>
+                else:
+                    stack.append((child, decimals, mm_per_unit))
+        if parent.tag not in TEXT_TAGS and parent.text is not None and not parent.text.strip():
+            parent.text = None
+
+        for name in list(parent.attrib):
+            if name.startswith((f'{{{SODIPODI_NS}}}', f'{{{INKSCAPE_NS}}}')) and name not in keep_attributes:
+                del parent.attrib[name]
+        if parent.get('style'):
+            parent.set('style', ';'.join(
+                declaration for declaration in parent.get('style').split(';')
+                if declaration.strip() and not declaration.strip().startswith('-inkscape-')
+            ))
+        if decimals is None:
+            continue  # leave viewports of unknown scale unrounded
+        if parent.get('d'):
+            parent.set('d', compact_path(parent.get('d'), decimals))
+        if parent.get('transform'):
+            parent.set('transform', compact_transform(parent.get('transform'), decimals))
+
+    return compact_decimals(root_mm_per_unit)
+
+
+def segment_distance(point, start, end):
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    length = dx * dx + dy * dy
+    t = 0 if length == 0 else max(0, min(1, ((point[0] - start[0]) * dx + (point[1] - start[1]) * dy) / length))
+    return math.hypot(start[0] + t * dx - point[0], start[1] + t * dy - point[1])
+
+
+def douglas_peucker(points, tolerance):
+    # which points to keep so that none removed is further than the tolerance from the simplified line
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        worst, worst_idx = 0, None
+        for idx in range(first + 1, last):
+            distance = segment_distance(points[idx], points[first], points[last])
+            if distance > worst:
+                worst, worst_idx = distance, idx
+        if worst > tolerance:
+            keep[worst_idx] = True
+            stack += [(first, worst_idx), (worst_idx, last)]
+
+    return keep
+
+
+def simplify_path(d, tolerance):
+    # simplify each run of straight segments, keeping curves and arcs as they are,
+    # returning the new path data, the vertices removed and the vertices there were
+    tokens = re.findall(rf'[A-Za-z]|{NUMBER_RE}', d)
+    ops = []
+    current = start = (0.0, 0.0)
+    idx = 0
+    command = None
+    while idx < len(tokens):
+        if tokens[idx].isalpha():
+            command = tokens[idx]
+            if command.upper() not in PATH_ARITY:
+                return d, 0, 0
+            idx += 1
+            if command.upper() == 'Z':
+                ops.append(('Z', None))
+                current = start
+                continue
+        elif command is None or command.upper() == 'Z':
+            return d, 0, 0
+
+        arity = PATH_ARITY[command.upper()]
+        try:
+            params = [float(token) for token in tokens[idx:idx + arity]]
+        except ValueError:
+            return d, 0, 0
+        if len(params) != arity:
+            return d, 0, 0
+
+        relative = command.islower()
+        upper = command.upper()
+        origin = current if relative else (0.0, 0.0)
+        if upper == 'H':
+            current = (origin[0] + params[0], current[1])
+        elif upper == 'V':
+            current = (current[0], origin[1] + params[0])
+        else:
+            current = (origin[0] + params[-2], origin[1] + params[-1])
+
+        if upper == 'M':
+            ops.append(('M', current))
+            start = current
+            command = 'l' if relative else 'L'  # further pairs are implicit linetos
+        elif upper in 'LHV':
+            ops.append(('L', current))
+        else:
+            ops.append((' '.join([command] + tokens[idx:idx + arity]), current))
+        idx += arity
+
+    out = []
+    removed = 0
+    run = []
+    current = start = (0.0, 0.0)
+    for op, point in ops + [(None, None)]:
+        if op == 'L':
+            run.append(point)
+            continue
+        if run:
+            keep = douglas_peucker([current] + run, tolerance)
+            removed += keep.count(False)
+            out += [
+                f'L {format_number(x, 6)},{format_number(y, 6)}'
+                for (x, y), kept in zip(run, keep[1:]) if kept
+            ]
+            current = run[-1]
+            run = []
+
+        if op == 'M':
+            out.append(f'M {format_number(point[0], 6)},{format_number(point[1], 6)}')
+            current = start = point
+        elif op == 'Z':
+            out.append('Z')
+            current = start
+        elif op is not None:
+            out.append(op)  # relative curves are unaffected, as runs keep their end points
+            current = point
+
+    vertices = sum(1 for op, _ in ops if op != 'Z')
+    return (' '.join(out) if removed else d), removed, vertices
+
+
+def simplify_matches(layers, names):
+    # the (name, label, position) of each chosen layer, matched by full label or by sublayer name
+    matches = []
+    for label, position in layers:
+        name = label if label in names else label.split('/')[-1]
+        if name in names:
+            matches.append((name, label, position))
+
+    return matches
+
+
+def simplify_tolerance_units(root, metres, real_scale):
+    # a tolerance in real world metres in the drawing's own units, or None if its scale is unknown
+    mm_per_unit = paper_mm_per_unit(root)
+    if mm_per_unit is None:
+        print("Unable to find the drawing scale, not simplifying")
+        return None
+
+    return metres * 1000 / (mm_per_unit * real_scale)
+
+
+def simplify_layers(layers, tolerance):
+    # simplify every path in the (label, position, element) layers, skipping those inside one already done
+    done = []
+    for label, position, layer in layers:
+        if any(position[:len(parent)] == parent for parent in done):
+            continue  # already simplified along with its parent
+        done.append(position)
+
+        removed = vertices = 0
+        stack = [layer]
+        while stack:
+            element = stack.pop()
+            if element.tag == f'{{{SVG_NS}}}path':
+                d, path_removed, path_vertices = simplify_path(element.get('d', ''), tolerance)
+                element.set('d', d)
+                removed += path_removed
+                vertices += path_vertices
+            # embedded templates are in their own units and were simplified when they were built
+            stack.extend(child for child in element if child.tag != f'{{{SVG_NS}}}svg')
+        print(f"Simplified {label}: removed {removed} of {vertices} vertices")
+
+
+class MultiWriter:
+    # writes the same bytes to several binary files
+    def __init__(self, *files):
+        self.files = files
+
+    def write(self, data):
+        for file in self.files:
+            file.write(data)
+        return len(data)
+
+
+class BrotliWriter:
+    def __init__(self, file):
+        import brotli  # optional, only needed for .svg.br outputs
+
+        self.file = file
+        self.compressor = brotli.Compressor()
+
+    def write(self, data):
+        self.file.write(self.compressor.process(data))
+        return len(data)
+
+    def close(self):
+        self.file.write(self.compressor.finish())
+
+
+def compressed_path(out_path, compression):
+    return Path(out_path).with_suffix(COMPRESSED_SUFFIXES[compression])
+
+
+@contextmanager
+def open_outputs(out_path, compress=()):
+    # a binary writer to the SVG and any compressed copies, so they're all produced in one serialisation
+    with ExitStack() as stack:
+        files = [stack.enter_context(open(out_path, 'wb'))]
+
+        gzip_files = [
+            stack.enter_context(open(compressed_path(out_path, compression), 'wb'))
+            for compression in ['svgz', 'gz'] if compression in compress
+        ]
+        if gzip_files:
+            # gzip once, with a fixed header so unchanged outputs compress to the same bytes
+            files.append(stack.enter_context(
+                gzip.GzipFile(filename='', mode='wb', fileobj=MultiWriter(*gzip_files), mtime=0)
+            ))
+
+        if 'br' in compress:
+            brotli_file = stack.enter_context(open(compressed_path(out_path, 'br'), 'wb'))
+            brotli_writer = BrotliWriter(brotli_file)
+            stack.callback(brotli_writer.close)
+            files.append(brotli_writer)
+
+        yield MultiWriter(*files)
+
+
+def output_name(spec):
+    return spec.get('title', 'output').replace(' ', '_') + '.svg'
+
+
+def file_hash(path):
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def spec_images(spec):
+    return [spec['image']] + [embedded['image'] for embedded in spec.get('embed', [])]
+
+
+def spec_inputs(spec_path, template_dir, base_scale, teams_file=None, options={}, known=None):
+    # hash everything that feeds into the output of a spec, reusing the output name and images
+    # of its previous manifest entry while the spec is unchanged so it needn't be parsed again
+    spec_hash = file_hash(spec_path)
+    if known is not None and known[1]['inputs'].get('spec') == spec_hash:
+        out_file = known[0]
+        images = [name[len('template '):] for name in known[1]['inputs'] if name.startswith('template ')]
+    else:
+        spec = load_config(spec_path)
+        out_file = output_name(spec)
+        images = spec_images(spec)
+
+    inputs = {
+        'generator': file_hash(__file__),
+        'base_scale': base_scale,
+        'options': {name: value for name, value in sorted(options.items()) if value},
+        'spec': spec_hash,
+    }
+    for image in images:
+        inputs[f'template {image}'] = file_hash(Path(template_dir) / image)
+    if teams_file:
+        inputs['teams'] = file_hash(teams_file)
+
+    return out_file, inputs
+
+
+def spec_dependencies(spec_path, template_dir, teams_file=None):
     spec = load_config(spec_path)
 
-    svg_file = Path(template_dir) / spec['image']
-    ns = register_xml_namespaces(svg_file)
+    deps = {Path(spec_path).resolve()}
+    deps.update((Path(template_dir) / image).resolve() for image in spec_images(spec))
+    if teams_file:
+        deps.add(Path(teams_file).resolve())
 
-    root_tree = ET.parse(svg_file)  # load svg
-    root = root_tree.getroot()
+    return deps
+
+
+def load_manifest(out_dir):
+    with suppress(FileNotFoundError, json.JSONDecodeError):
+        with open(Path(out_dir) / MANIFEST_FILE, 'r') as file:
+            return json.load(file)
+
+    return {}
+
+
+def save_manifest(out_dir, manifest):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(exist_ok=True)
+    with open(out_dir / MANIFEST_FILE, 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+
+
+def stale_reasons(entry, inputs, out_path):
+    if not out_path.exists():
+        return ['output missing']
+    if entry is None:
+        return ['not in manifest']
+
+    old_inputs = entry.get('inputs', {})
+    return [
+        f'{name} changed'
+        for name in sorted(inputs.keys() | old_inputs.keys())
+        if inputs.get(name) != old_inputs.get(name)
+    ]
+
+
+def generate_svg(spec_path, template_dir, out_dir, base_scale, teams_file=None, **options):
+    with profile_phase('spec'):
+        spec = load_config(spec_path)
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(exist_ok=True)
+
+    render_svg(spec, template_dir, out_dir / output_name(spec), base_scale, teams_file, **options)
 
-    root = set_titles(
-        root,
-        spec.get('title', spec['image']),
-        spec.get('version', 0.1),
-        spec.get('scale', 1) * base_scale,
-        ns,
-    )
+
+def render_svg(
+    spec, template_dir, out_path, base_scale, teams_file=None,
+    stream=False, symbols=False, prune=False, compact=False, compress=(), simplify=(), simplify_tolerance=0.05,
+):
+    if stream:
+        return stream_render_svg(spec, template_dir, out_path, base_scale, teams_file, compress)
+
+    team_names = None
+    with profile_phase('load'):
+        svg_file = Path(template_dir) / spec['image']
+        template = load_template(svg_file)  # load svg
+        root_tree, ns = template.tree, template.ns
+        root = root_tree.getroot()
+
+    with profile_phase('titles'):
+        root = set_titles(
+            root,
+            spec.get('title', spec['image']),
+            spec.get('version', 0.1),
+            spec.get('scale', 1) * base_scale,
+            ns,
+        )
 
     if teams_file:
-        team_names = load_config(teams_file)
-        root = insert_tlas(root, team_names, ns)
+        with profile_phase('tlas'):
+            team_names = load_config(teams_file)
+            insert_tlas(root, team_names, template.placeholders)
 
     # set scale
     try:
@@ -162,16 +1021,633 @@ def generate_svg(spec_path, template_dir, out_dir, base_scale, teams_file=None):
     root.set('height', str(old_height / scale) + "cm")
 
     # display only selected layers or ALL
-    print_layers(root, spec.get('show', ['ALL']), spec.get('hide', []), ns=ns)
+    with profile_phase('layers'):
+        print_layers(root, template.layers, spec.get('show', ['ALL']), spec.get('hide', []))
+
+    # find the layers to simplify before embedding, as adding <defs> for symbols moves them
+    simplify_found = simplify_matches(template.layers, simplify)
+    simplify_targets = [(label, position, element_at(root, position)) for _, label, position in simplify_found]
 
     for embedded in spec.get('embed', []):  # add nested svgs (including key)
-        root = embed_svg(embedded, root, ns, template_dir, team_names)
+        with profile_phase(f"embed {embedded['marker']} {embedded['image']}"):
+            root = embed_svg(
+                embedded, root, ns, template_dir, team_names, symbols=symbols,
+                simplify=simplify, simplify_tolerance=simplify_tolerance, base_scale=base_scale,
+            )
 
-    out_dir = Path(out_dir)
-    out_dir.mkdir(exist_ok=True)
+    if simplify:
+        with profile_phase('simplify'):
+            # the tolerance is in real world metres, so depends on the printed scale
+            tolerance = simplify_tolerance_units(root, simplify_tolerance, spec.get('scale', 1) * base_scale)
+            if tolerance is not None:
+                simplify_layers(simplify_targets, tolerance)
+
+            # embedded templates simplify their own layers, so only report layers that none of them have
+            found = {name for name, _, _ in simplify_found}
+            for embedded in spec.get('embed', []):
+                with suppress(OSError, ET.ParseError):
+                    embedded_layers = cached_template(Path(template_dir) / embedded['image']).layers
+                    found.update(name for name, _, _ in simplify_matches(embedded_layers, simplify))
+            for name in simplify:
+                if name not in found:
+                    print(f"No layer {name} to simplify")
+
+    out_file = Path(out_path).name
+    if prune:
+        with profile_phase('prune'):
+            removed_elements, removed_bytes = prune_hidden(root)
+        print(f"Pruned {removed_elements} hidden elements ({removed_bytes} bytes) from {out_file}")
+
+    if compact:
+        with profile_phase('compact'):
+            original_size = len(ET.tostring(root, encoding='UTF-8', xml_declaration=True))
+            decimals = compact_svg(root)
+
+    with profile_phase('write'), open_outputs(out_path, compress) as file:
+        root_tree.write(file, xml_declaration=True, encoding='UTF-8')
+
+    if compact:
+        compact_size = Path(out_path).stat().st_size
+        print(
+            f"Compacted {out_file} to {decimals} decimal places: {original_size} -> {compact_size} bytes "
+            f"({100 * (1 - compact_size / original_size):.0f}% smaller)"
+        )
+
+
+class StreamingTransform(ContentHandler):
+    # applies layer visibility, text substitutions, TLA insertion and embeds while the
+    # template is being read, writing each event straight to the output
+    def __init__(
+        self, out, show=['ALL'], hide=[], scale=None, titles={}, replace_tla=None,
+        embeds=[], template_dir=None, root_attrs={}, nested=False,
+    ):
+        super().__init__()
+        self.out = out
+        self.show = show  # None leaves layer visibility untouched
+        self.hide = hide
+        self.scale = scale
+        self.titles = dict(titles)
+        self.replace_tla = replace_tla
+        self.embeds = {embedded['marker']: embedded for embedded in embeds}
+        self.template_dir = template_dir
+        self.root_attrs = root_attrs
+        self.nested = nested
+
+        self.stack = []
+        self.text = []
+        self.skip = 0
+        self.seen_tla = False
+        self.labels = set()
+
+    def startDocument(self):
+        if not self.nested:
+            self.out.startDocument()
+
+    def endDocument(self):
+        for label in [*(self.show or []), *self.hide]:
+            if label != 'ALL' and label not in self.labels:
+                print(f'Unknown layer: {label}')
+        for marker in self.embeds:
+            print(f"Failed to find the marker {marker}")
+
+        if not self.nested:
+            self.out.endDocument()
+
+    def startPrefixMapping(self, prefix, uri):
+        if not self.skip:
+            self.out.startPrefixMapping(prefix, uri)
+
+    def endPrefixMapping(self, prefix):
+        if not self.skip:
+            self.out.endPrefixMapping(prefix)
+
+    def startElementNS(self, name, qname, attrs):
+        if self.skip:
+            self.skip += 1
+            return
+
+        self.flush_text()
+        attrs = dict(attrs.items())
+        parent = self.stack[-1] if self.stack else None
+        info = {'name': name, 'depth': None, 'label': '', 'shown': False, 'tla': bool(parent and parent['tla'])}
 
-    out_file = spec.get('title', 'output').replace(' ', '_') + '.svg'
-    root_tree.write(out_dir / out_file, xml_declaration=True, encoding='UTF-8')
+        if parent is None:
+            info['depth'] = 0
+            self.transform_root(attrs)
+        elif name == (SVG_NS, 'rect') and attrs.get((None, 'id')) in self.embeds:
+            self.embed(self.embeds.pop(attrs[(None, 'id')]), attrs)
+            self.skip = 1
+            return
+        elif name == (SVG_NS, 'g'):
+            if parent['depth'] == 0 and not self.seen_tla and attrs.get((INKSCAPE_NS, 'label')) == 'TLA':
+                self.seen_tla = info['tla'] = True
+            if parent['depth'] is not None and attrs.get((INKSCAPE_NS, 'groupmode')) == 'layer':
+                self.transform_layer(info, parent, attrs)
+
+        self.stack.append(info)
+        self.out.startElementNS(name, qname, attrs)
+
+    def endElementNS(self, name, qname):
+        if self.skip:
+            self.skip -= 1
+            return
+
+        self.flush_text()
+        self.stack.pop()
+        self.out.endElementNS(name, qname)
+
+    def characters(self, content):
+        if not self.skip:
+            self.text.append(content)
+
+    def ignorableWhitespace(self, whitespace):
+        self.characters(whitespace)
+
+    def processingInstruction(self, target, data):
+        if not self.skip:
+            self.flush_text()
+            self.out.processingInstruction(target, data)
+
+    def flush_text(self):
+        text = ''.join(self.text)
+        self.text = []
+        if not text:
+            return
+
+        if self.stack[-1]['name'] == (SVG_NS, 'tspan'):
+            if text in self.titles:
+                text = self.titles.pop(text)
+            elif self.stack[-1]['tla'] and self.stack[-2]['name'] == (SVG_NS, 'text') and self.replace_tla:
+                replacement = self.replace_tla(text)
+                if replacement is not None:
+                    text = replacement
+
+        self.out.characters(text)
+
+    def transform_root(self, attrs):
+        if self.scale is not None:
+            for field in ['width', 'height']:
+                old_value = float(attrs[(None, field)][:-2])
+                attrs[(None, field)] = str(old_value / self.scale) + "cm"
+
+        for field, value in self.root_attrs.items():
+            if value is not None:
+                attrs[(None, field)] = value
+
+    def transform_layer(self, info, parent, attrs):
+        info['depth'] = parent['depth'] + 1
+        info['label'] = (parent['label'] + '/' if parent['label'] else '') + attrs.get((INKSCAPE_NS, 'label'), "")
+        self.labels.add(info['label'])
+
+        # top level layers are shown if listed (or ALL), their direct sublayers are shown unless hidden
+        autoshow = info['depth'] == 2
+        if self.show is None or info['depth'] > 2 or (autoshow and not parent['shown']):
+            return
+
+        label = info['label']
+        if label not in self.hide and (autoshow or label in self.show or 'ALL' in self.show):
+            attrs.pop((None, 'style'), None)
+            print(f'Show: {label}')
+            info['shown'] = True
+        else:
+            attrs[(None, 'style')] = 'display:none'
+            print(f'Hide: {label}')
+
+    def embed(self, embedded, marker_attrs):
+        print(f"Embedding {embedded['image']}")
+        handler = StreamingTransform(
+            self.out,
+            show=embedded.get('show', ['ALL']),
+            hide=embedded.get('hide', []),
+            replace_tla=self.replace_tla,
+            root_attrs={field: marker_attrs.get((None, field)) for field in ['x', 'y', 'width', 'height']},
+            nested=True,
+        )
+        stream_svg(Path(self.template_dir) / embedded['image'], handler)
+        print(f"Embedded {embedded['image']}")
+
+
+def stream_svg(svg_file, handler):
+    parser = xml.sax.make_parser()
+    parser.setFeature(feature_namespaces, True)
+    parser.setContentHandler(handler)
+    parser.parse(str(svg_file))
+
+
+def stream_render_svg(spec, template_dir, out_path, base_scale, teams_file=None, compress=()):
+    replace_tla = None
+
+    if teams_file:
+        team_names = load_config(teams_file)
+
+        def replace_tla(text):
+            team_no = re.search(r'@T_(\d+)', text)
+            if team_no is not None:
+                return team_names.get(int(team_no[1]), '')
+
+    with open_outputs(out_path, compress) as file:
+        handler = StreamingTransform(
+            saxutils.XMLGenerator(file, encoding='UTF-8', short_empty_elements=True),
+            show=spec.get('show', ['ALL']),
+            hide=spec.get('hide', []),
+            scale=spec.get('scale', 1),
+            titles={
+                '{{title}}': spec.get('title', spec['image']),
+                '{{version}}': f"Version: {spec.get('version', 0.1)}",
+                '{{scale}}': f"Scale 1:{spec.get('scale', 1) * base_scale:.0f}",
+            },
+            replace_tla=replace_tla,
+            embeds=spec.get('embed', []),
+            template_dir=template_dir,
+        )
+        stream_svg(Path(template_dir) / spec['image'], handler)
+
+
+def render_spec(spec_path, template_dir, out_dir, base_scale, teams_file=None, profile=False, **options):
+    # capture the console output so that parallel renders can be reported in order
+    log = io.StringIO()
+    records = []
+    with redirect_stdout(log):
+        print(f"Processing spec file {spec_path}")
+        args = (spec_path, template_dir, out_dir, base_scale)
+        try:
+            if profile:
+                records = profile_call(generate_svg, *args, teams_file=teams_file, **options)
+            else:
+                generate_svg(*args, teams_file=teams_file, **options)
+        except Exception:
+            traceback.print_exc(file=log)
+            return spec_path, False, log.getvalue(), records
+
+    return spec_path, True, log.getvalue(), [{'spec': str(spec_path), **record} for record in records]
+
+
+def report_renders(results, profile=None):
+    failed = []
+    for spec_path, success, log, records in results:
+        print(log, end='')
+        if not success:
+            failed.append(spec_path)
+        if profile is not None:
+            profile.extend(records)
+
+    return failed
+
+
+def render_specs(specs, template_dir, out_dir, base_scale, teams_file=None, jobs=1, profile=None, **options):
+    render = partial(
+        render_spec,
+        template_dir=template_dir, out_dir=out_dir, base_scale=base_scale, teams_file=teams_file,
+        profile=profile is not None, **options,
+    )
+
+    jobs = min(jobs, len(specs))
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            return report_renders(executor.map(render, specs), profile)
+
+    return report_renders(map(render, specs), profile)
+
+
+def build_specs(
+    specs, template_dir, out_dir, base_scale, teams_file=None, force=False, jobs=1, profile=None, **options,
+):
+    manifest = load_manifest(out_dir)
+    # entries are keyed by the resolved spec path, so builds run from different folders share them
+    known = {entry.get('spec'): (out_file, entry) for out_file, entry in manifest.items()}
+    entries = {}
+    to_build = []
+    for spec in specs:
+        try:
+            out_file, inputs = spec_inputs(
+                spec, template_dir, base_scale, teams_file, options, known.get(str(Path(spec).resolve())),
+            )
+        except (OSError, KeyError, TypeError, yaml.YAMLError) as e:
+            # let the render report the problem properly
+            print(f"Rebuilding {spec}: unable to hash inputs ({e})")
+            to_build.append(spec)
+            continue
+
+        if force:
+            reasons = ['forced']
+        else:
+            reasons = stale_reasons(manifest.get(out_file), inputs, Path(out_dir) / out_file)
+
+        if reasons:
+            print(f"Rebuilding {out_file}: {', '.join(reasons)}")
+            to_build.append(spec)
+            entries[spec] = (out_file, inputs)
+        else:
+            print(f"Skipping {out_file}: up to date")
+
+    if teams_file and to_build:
+        # only worth checking when something is rebuilt, as it parses every template
+        report_team_coverage(specs, template_dir, load_config(teams_file))
+
+    failed = render_specs(
+        to_build, template_dir, out_dir, base_scale, teams_file=teams_file, jobs=jobs, profile=profile, **options,
+    )
+
+    for spec, (out_file, inputs) in entries.items():
+        if spec not in failed:
+            manifest[out_file] = {'spec': str(Path(spec).resolve()), 'inputs': inputs}
+    save_manifest(out_dir, manifest)
+
+    if failed:
+        print(f"Failed to render: {', '.join(str(spec) for spec in failed)}")
+
+    return failed
+
+
+def report_profile(profile, profile_file):
+    with open(profile_file, 'w') as file:
+        json.dump(profile, file, indent=2)
+
+    print(f"{'seconds':>10}  {'peak MiB':>9}  phase")
+    for record in sorted(profile, key=lambda record: -record['seconds']):
+        print(
+            f"{record['seconds']:10.4f}  {record['peak_bytes'] / 2**20:9.2f}  "
+            f"{Path(record['spec']).name}: {record['phase']}"
+        )
+    print(f"Profile written to {profile_file}")
+
+
+def cprofile_slowest(profile, cprofile_file, template_dir, out_dir, base_scale, teams_file=None, **options):
+    totals = [record for record in profile if record['phase'] == 'total']
+    if not totals:
+        return
+
+    slowest = max(totals, key=lambda record: record['seconds'])['spec']
+    profiler = cProfile.Profile()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        profiler.runcall(generate_svg, slowest, template_dir, out_dir, base_scale, teams_file=teams_file, **options)
+    profiler.dump_stats(cprofile_file)
+    print(f"cProfile stats for {slowest} written to {cprofile_file}")
+
+
+def find_teams(year_dir):
+    for name in ['team_names.yaml', 'team_names.txt']:
+        if (Path(year_dir) / name).exists():
+            return Path(year_dir) / name
+
+    return None
+
+
+def find_specs(spec_source):
+    if spec_source.is_file():
+        return [spec_source]
+    if spec_source.is_dir():
+        return sorted(spec for spec in spec_source.iterdir() if spec.is_file())
+
+    return None
+
+
+def watch_snapshot(spec_source, template_dir, teams_file=None):
+    paths = list(find_specs(spec_source) or [])
+    paths.extend(path for path in Path(template_dir).iterdir() if path.is_file())
+    if teams_file:
+        paths.append(Path(teams_file))
+
+    mtimes = {}
+    for path in paths:
+        with suppress(FileNotFoundError):
+            mtimes[path.resolve()] = path.stat().st_mtime_ns
+
+    return mtimes
+
+
+def watch_specs(spec_source, template_dir, out_dir, base_scale, teams_file=None, interval=0.5, **options):
+    # rebuild only the specs depending on changed files, reusing the in-process template cache
+    deps = {}
+    mtimes = watch_snapshot(spec_source, template_dir, teams_file)
+    print(f"Watching {spec_source}, {template_dir} and {teams_file or 'no teams file'} for changes")
+
+    try:
+        while True:
+            time.sleep(interval)
+            new_mtimes = watch_snapshot(spec_source, template_dir, teams_file)
+            changed = {
+                path for path in mtimes.keys() | new_mtimes.keys()
+                if mtimes.get(path) != new_mtimes.get(path)
+            }
+            mtimes = new_mtimes
+            if not changed:
+                continue
+
+            for path in sorted(changed):
+                print(f"Changed: {path}")
+
+            specs = find_specs(spec_source) or []
+            for spec in specs:
+                if spec not in deps or spec.resolve() in changed:
+                    try:
+                        deps[spec] = spec_dependencies(spec, template_dir, teams_file)
+                    except (OSError, KeyError, TypeError, yaml.YAMLError):
+                        deps[spec] = {spec.resolve()}
+
+            affected = [spec for spec in specs if deps[spec] & changed]
+            build_specs(affected, template_dir, out_dir, base_scale, teams_file=teams_file, **options)
+    except KeyboardInterrupt:
+        return 0
+
+
+def check_spec(spec_path, template_dir, teams=None):
+    # the problems that would show up while rendering a spec, found from the template indices alone,
+    # as (level, message) where errors break the output and warnings only leave something out
+    try:
+        spec = load_config(spec_path)
+        template = cached_template(Path(template_dir) / spec['image'])
+    except (OSError, KeyError, TypeError, ET.ParseError, ValueError, yaml.YAMLError) as e:
+        return [('error', f"unable to load ({type(e).__name__}: {e})")]
+
+    problems = []
+    root = template.tree.getroot()
+    for slot in TITLE_SLOTS:
+        if root.find(f'.//svg:text[svg:tspan="{slot}"]', template.ns) is None:
+            problems.append(('warning', f"{spec['image']} has no {slot} text"))
+
+    for label in unknown_layers(template.layers, spec.get('show', ['ALL']), spec.get('hide', [])):
+        problems.append(('warning', f"{spec['image']} has no layer {label}"))
+
+    # markers may be in the main template or in anything embedded before them
+    trees = [template]
+    used = [(spec['image'], template)]
+    for embedded in spec.get('embed', []):
+        try:
+            embedded_template = cached_template(Path(template_dir) / embedded['image'])
+            marker = embedded['marker']
+        except (OSError, KeyError, TypeError, ET.ParseError) as e:
+            problems.append(('error', f"unable to load embed ({type(e).__name__}: {e})"))
+            continue
+
+        if not any(tree.tree.getroot().find(f'.//svg:rect[@id="{marker}"]', tree.ns) is not None for tree in trees):
+            problems.append(('error', f"no marker {marker} for {embedded['image']}"))
+
+        for label in unknown_layers(embedded_template.layers, embedded.get('show', ['ALL']), embedded.get('hide', [])):
+            problems.append(('warning', f"{embedded['image']} has no layer {label}"))
+
+        trees.append(embedded_template)
+        used.append((embedded['image'], embedded_template))
+
+    if teams is not None:
+        for image, used_template in dict(used).items():
+            for team_no in sorted(used_template.placeholders):
+                if team_no not in teams:
+                    problems.append(('error', f"{image} has no team for placeholder @T_{team_no}"))
+
+    return problems
+
+
+def check_specs(specs, template_dir, teams_file=None):
+    # validate every spec without rendering anything, returning the number of errors
+    try:
+        teams = load_config(teams_file) if teams_file else None
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        print(f"{teams_file}: error: unable to load ({type(e).__name__}: {e})")
+        return 1
+
+    levels = Counter()
+    for spec in specs:
+        for level, message in check_spec(spec, template_dir, teams):
+            print(f"{spec}: {level}: {message}")
+            levels[level] += 1
+
+    print(f"Checked {len(specs)} specs: {levels['error']} errors, {levels['warning']} warnings")
+    return levels['error']
+
+
+def run_job(job, template_dir, out_dir, base_scale, **options):
+    # render one server job, returning its status
+    start = time.perf_counter()
+    log = io.StringIO()
+    result = {'id': job.get('id')}
+    with redirect_stdout(log):
+        try:
+            spec = job['spec']
+            if not isinstance(spec, dict):
+                spec = load_config(spec)
+
+            out_path = Path(job.get('output') or Path(out_dir) / output_name(spec))
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+            result['output'] = str(out_path)
+
+            render_svg(
+                spec,
+                job.get('templates', template_dir),
+                out_path,
+                job.get('base_scale', base_scale),
+                job.get('teams'),
+                **{**options, **job.get('options', {})},
+            )
+            result['status'] = 'ok'
+        except Exception as e:
+            traceback.print_exc(file=log)
+            result['status'] = 'error'
+            result['error'] = f'{type(e).__name__}: {e}'
+
+    result['seconds'] = time.perf_counter() - start
+    result['log'] = log.getvalue()
+    return result
+
+
+def serve_jobs(jobs_in, results_out, template_dir, out_dir, base_scale, **options):
+    # read newline-delimited JSON jobs, writing one JSON status line back per job
+    for line in jobs_in:
+        if not line.strip():
+            continue
+
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict) or 'spec' not in job:
+                raise ValueError("a job must be an object with a 'spec'")
+        except ValueError as e:
+            result = {'id': None, 'status': 'error', 'error': f'Invalid job: {e}'}
+        else:
+            result = run_job(job, template_dir, out_dir, base_scale, **options)
+
+        results_out.write(json.dumps(result) + '\n')
+        results_out.flush()
+
+
+def serve_socket(socket_path, template_dir, out_dir, base_scale, **options):
+    import socketserver
+
+    class JobHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            serve_jobs(
+                io.TextIOWrapper(self.rfile, encoding='UTF-8'),
+                io.TextIOWrapper(self.wfile, encoding='UTF-8', write_through=True),
+                template_dir, out_dir, base_scale, **options,
+            )
+
+    with suppress(FileNotFoundError):
+        os.remove(socket_path)
+
+    with socketserver.UnixStreamServer(str(socket_path), JobHandler) as server:
+        print(f"Serving render jobs on {socket_path}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
+
+    return 0
+
+
+def layer_list(value):
+    return [layer.strip() for layer in value.split(',') if layer.strip()]
+
+
+def compression_list(value):
+    compress = [compression.strip() for compression in value.split(',') if compression.strip()]
+    for compression in compress:
+        if compression not in COMPRESSED_SUFFIXES:
+            raise argparse.ArgumentTypeError(f"unknown compression '{compression}'")
+        if compression == 'br' and importlib.util.find_spec('brotli') is None:
+            raise argparse.ArgumentTypeError("br compression requires the brotli package")
+
+    return compress
+
+
+def add_render_arguments(parser):
+    # the options that change how each spec is rendered, shared with build.py
+    parser.add_argument('--stream', action='store_true', help=(
+        "Transform templates in a single streaming pass, keeping memory use flat for very large templates"
+    ))
+    parser.add_argument('--symbols', action='store_true', help=(
+        "Embed each template once as a symbol, placed with <use> at each marker, instead of copying it"
+    ))
+    parser.add_argument('--prune-hidden', action='store_true', help=(
+        "Remove hidden layers from the output instead of only marking them display:none"
+    ))
+    parser.add_argument('--compact', action='store_true', help=(
+        "Strip editor metadata and round path and transform numbers to the precision the scale can print"
+    ))
+    parser.add_argument('--simplify', type=layer_list, default=[], help=(
+        "Comma separated layers, e.g. VenueFloorplan, whose straight path runs are simplified with Douglas-Peucker"
+    ))
+    parser.add_argument('--simplify-tolerance', type=float, default=0.05, help=(
+        "How far in real world metres --simplify may move a path, defaults to %(default)s"
+    ))
+    parser.add_argument('--compress', type=compression_list, default=[], help=(
+        "Comma separated compressed copies to write next to each output: svgz, gz (.svg.gz) or br (.svg.br)"
+    ))
+
+
+def render_options(args, parser):
+    # the render_svg keyword arguments for the options added by add_render_arguments
+    if args.stream and (args.symbols or args.prune_hidden or args.compact or args.simplify):
+        parser.error("--symbols, --prune-hidden, --compact and --simplify are not supported with --stream")
+
+    options = {
+        'stream': args.stream, 'symbols': args.symbols, 'prune': args.prune_hidden, 'compact': args.compact,
+        'compress': args.compress,
+    }
+    if args.simplify:
+        options.update(simplify=args.simplify, simplify_tolerance=args.simplify_tolerance)
+
+    return options
 
 
 def main():
@@ -192,21 +1668,70 @@ def main():
     parser.add_argument('-o', '--output', type=Path, default=Path('output/'), help=(
         "Folder to store the output SVG's, defaults to '%(default)s'"
     ))
+    parser.add_argument('-f', '--force', action='store_true', help=(
+        "Rebuild every output, even if its inputs are unchanged"
+    ))
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help=(
+        "Number of specs to render in parallel, defaults to %(default)s"
+    ))
+    add_render_arguments(parser)
+    parser.add_argument('--profile', type=Path, default=None, help=(
+        "Record the time and peak memory of each phase, spec and embed to this JSON file"
+    ))
+    parser.add_argument('--cprofile', type=Path, default=None, help=(
+        "With --profile, re-run the slowest spec under cProfile and dump the stats to this file"
+    ))
+    parser.add_argument('--check', action='store_true', help=(
+        "Only check that the specs' templates, markers, layers, title slots and teams exist, without rendering, "
+        "exiting non-zero on any error"
+    ))
+    parser.add_argument('--serve', action='store_true', help=(
+        "Render newline-delimited JSON jobs read from stdin, writing a JSON status line per job to stdout"
+    ))
+    parser.add_argument('--socket', type=Path, default=None, help=(
+        "Serve render jobs on this Unix socket instead of stdin"
+    ))
+    parser.add_argument('-w', '--watch', action='store_true', help=(
+        "Keep running and rebuild outputs whenever a spec, template or the teams file changes"
+    ))
 
     args = parser.parse_args()
+    options = render_options(args, parser)
 
-    if args.specs.is_file():
-        generate_svg(args.specs, args.templates, args.output, args.base_scale, teams_file=args.teams)
-    elif args.specs.is_dir():
-        for spec in args.specs.iterdir():
-            if not spec.is_file():
-                continue
+    if args.socket:
+        return serve_socket(args.socket, args.templates, args.output, args.base_scale, **options)
+    if args.serve:
+        serve_jobs(sys.stdin, sys.stdout, args.templates, args.output, args.base_scale, **options)
+        return 0
 
-            print(f"Processing spec file {spec}")
-            generate_svg(spec, args.templates, args.output, args.base_scale, teams_file=args.teams)
-    else:
+    specs = find_specs(args.specs)
+    if specs is None:
         print("The specification is neither a file nor directory")
+        return 1
+
+    if args.check:
+        return 1 if check_specs(specs, args.templates, args.teams) else 0
+
+    profile = [] if args.profile else None
+
+    failed = build_specs(
+        specs, args.templates, args.output, args.base_scale,
+        teams_file=args.teams, force=args.force, jobs=args.jobs, profile=profile, **options,
+    )
+    if profile is not None:
+        report_profile(profile, args.profile)
+        if args.cprofile:
+            cprofile_slowest(
+                profile, args.cprofile, args.templates, args.output, args.base_scale, args.teams, **options,
+            )
+
+    if args.watch:
+        return watch_specs(
+            args.specs, args.templates, args.output, args.base_scale, teams_file=args.teams, **options,
+        )
+
+    return 1 if failed else 0
 
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
@@ -1,13 +1,16 @@
 #!/usr/bin/env python3
 import re
 import argparse
-import xml.etree.ElementTree as ET
 from pathlib import Path
+from functools import partial
+from xml.sax.saxutils import XMLGenerator
 
-from generate_svg import load_config, register_xml_namespaces
+from generate_svg import (
+    StreamingTransform, compression_list, load_config, open_outputs, parse_svg, stream_svg,
+)
 
 
-def insert_tla_list(svg_root, teams, ns):
+def team_list(teams):
     # Sort teams so the list is alphabetical by TLA
     teams_alphabetical = sorted(teams.items(), key=lambda x: x[1])
     teams_alphabetical = (
@@ -15,37 +18,66 @@ def insert_tla_list(svg_root, teams, ns):
         # remove unused pits, represented with an em dash or hyphen
         if tla not in ['—', '-']
     )
-    team_dict = dict(enumerate(teams_alphabetical, start=1))
+    return dict(enumerate(teams_alphabetical, start=1))
+
+
+def tla_list_text(text, team_dict):
+    # the replacement text for a @t_n or @I_n placeholder, or None if it isn't one
+    team_no = re.search(r'@t_(\d+)', text)
+    if team_no is not None:
+        tla_data = team_dict.get(int(team_no[1]))
+        return f"{tla_data[1]}:" if tla_data is not None else ""
+
+    idx_no = re.search(r'@I_(\d+)', text)
+    if idx_no is not None:
+        tla_data = team_dict.get(int(idx_no[1]))
+        return str(tla_data[0]) if tla_data is not None else ""
+
+    return None
+
+
+def insert_tla_list(svg_root, teams, ns):
+    team_dict = team_list(teams)
 
     TLA = svg_root.find('svg:g[@inkscape:label="TLA"]', ns)  # add team names
     if TLA:
         for team in TLA.findall('.//svg:text/svg:tspan', ns):
             if team.text is None:
                 continue
-            team_no = re.search(r'@t_(\d+)', team.text)
-            if team_no is not None:
-                tla_data = team_dict.get(int(team_no[1]))
-                team.text = f"{tla_data[1]}:" if tla_data is not None else ""
-            else:
-                idx_no = re.search(r'@I_(\d+)', team.text)
-                if idx_no is not None:
-                    tla_data = team_dict.get(int(idx_no[1]))
-                    team.text = str(tla_data[0]) if tla_data is not None else ""
+            text = tla_list_text(team.text, team_dict)
+            if text is not None:
+                team.text = text
 
     return svg_root
 
 
-def generate_map_svg(svg_file, out_file, teams_file=None):
-    ns = register_xml_namespaces(svg_file)
+def generate_map_svg(svg_file, out_file, teams_file=None, stream=False, compress=()):
+    if stream:
+        return stream_map_svg(svg_file, out_file, teams_file, compress)
 
-    root_tree = ET.parse(svg_file)  # load svg
+    root_tree, ns = parse_svg(svg_file)  # load svg
     root = root_tree.getroot()
 
     if teams_file:
         team_names = load_config(teams_file)
         insert_tla_list(root, team_names, ns)
 
-    root_tree.write(Path(out_file), xml_declaration=True, encoding='UTF-8')
+    with open_outputs(Path(out_file), compress) as file:
+        root_tree.write(file, xml_declaration=True, encoding='UTF-8')
+
+
+def stream_map_svg(svg_file, out_file, teams_file=None, compress=()):
+    replace_tla = None
+    if teams_file:
+        replace_tla = partial(tla_list_text, team_dict=team_list(load_config(teams_file)))
+
+    with open_outputs(Path(out_file), compress) as file:
+        handler = StreamingTransform(
+            XMLGenerator(file, encoding='UTF-8', short_empty_elements=True),
+            show=None,
+            replace_tla=replace_tla,
+        )
+        stream_svg(svg_file, handler)
 
 
 def main():
@@ -60,9 +92,17 @@ def main():
         "Filepath of the output SVG, defaults to '%(default)s'"
     ))
 
+    parser.add_argument('--stream', action='store_true', help=(
+        "Transform the map in a single streaming pass, keeping memory use flat for very large maps"
+    ))
+
+    parser.add_argument('--compress', type=compression_list, default=[], help=(
+        "Comma separated compressed copies to write next to the output: svgz, gz (.svg.gz) or br (.svg.br)"
+    ))
+
     args = parser.parse_args()
 
-    generate_map_svg(args.map, args.output, teams_file=args.teams)
+    generate_map_svg(args.map, args.output, teams_file=args.teams, stream=args.stream, compress=args.compress)
 
 
 if __name__ == "__main__":
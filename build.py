@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+import importlib
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent
+GENERATOR_DIR = REPO_DIR / '2025'  # the shared generator, every year from 2019 builds with it
+BASE_SCALES = {'2019': 1}  # 2019 specs give the absolute scale rather than a multiple of the base scale
+DEFAULT_BASE_SCALE = 100
+
+sys.path.insert(0, str(GENERATOR_DIR))
+generate_svg = importlib.import_module('generate_svg')
+
+
+def year_dirs():
+    return [path for path in sorted(REPO_DIR.glob('20*')) if (path / 'layouts').is_dir()]
+
+
+def map_stale(map_svg, teams_file, out_file):
+    if not out_file.exists():
+        return True
+
+    built = out_file.stat().st_mtime_ns
+    return any(path.stat().st_mtime_ns > built for path in [map_svg, teams_file] if path)
+
+
+def build_year(year_dir, base_scale, force=False, jobs=1, **options):
+    # build a year's layouts, and its team map if it has one, returning the failed outputs
+    year_dir = Path(year_dir)
+    teams_file = generate_svg.find_teams(year_dir)
+    out_dir = year_dir / 'output'
+
+    failed = generate_svg.build_specs(
+        generate_svg.find_specs(year_dir / 'layouts'), year_dir / 'templates', out_dir, base_scale,
+        teams_file=teams_file, force=force, jobs=jobs, **options,
+    )
+
+    map_svg = year_dir / 'templates' / 'map.svg'
+    out_file = out_dir / 'map-with-teams.svg'
+    if map_svg.exists():
+        if force or map_stale(map_svg, teams_file, out_file):
+            print(f"Rebuilding {out_file.name}")
+            populate_map = importlib.import_module('populate-map')
+            try:
+                populate_map.generate_map_svg(
+                    map_svg, out_file, teams_file, stream=options.get('stream', False),
+                    compress=options.get('compress', ()),
+                )
+            except Exception as e:
+                print(f"Failed to render {out_file.name}: {e}")
+                failed.append(map_svg)
+        else:
+            print(f"Skipping {out_file.name}: up to date")
+
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the floorplans of several years in one process")
+    parser.add_argument('years', type=Path, nargs='*', default=year_dirs(), help=(
+        "Year folders to build, each with layouts/ and templates/, defaults to every year that has layouts"
+    ))
+    parser.add_argument('-s', '--base-scale', type=int, help=(
+        f"The initial 1:X scale that the template files are at, defaults to {DEFAULT_BASE_SCALE}, "
+        "or 1 for 2019 whose specs give absolute scales"
+    ))
+    parser.add_argument('-f', '--force', action='store_true', help=(
+        "Rebuild every output, even if its inputs are unchanged"
+    ))
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help=(
+        "Number of specs to render in parallel, defaults to %(default)s"
+    ))
+    generate_svg.add_render_arguments(parser)
+
+    args = parser.parse_args()
+    options = generate_svg.render_options(args, parser)
+
+    failed = []
+    for year_dir in args.years:
+        print(f"## {year_dir.resolve().name}")
+        base_scale = args.base_scale or BASE_SCALES.get(year_dir.resolve().name, DEFAULT_BASE_SCALE)
+        failed += build_year(year_dir, base_scale, force=args.force, jobs=args.jobs, **options)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())